@@ -0,0 +1,101 @@
+import argparse
+import contextlib
+import math
+import os
+import time
+from multiprocessing import Pool
+import engine
+import bots
+
+# Plays bots head to head: every policy plays the same seeds, and the report
+# gives each one's win rate with a 95% confidence interval, its mean rooms
+# cleared and how many decisions it makes per second per core, then compares
+# every pair seed by seed. Games are played in chunks on a process pool,
+# each chunk in lockstep through the policy's choose_batch() (NumPy arrays
+# of all its games at once for greedy and random, when numpy is installed).
+#
+# This is the benchmark for balance changes to the decks: run it before and
+# after with the same --seed.
+#
+# Usage: python arena.py --difficulty normal --games 2000 --policies greedy conserve mcts
+
+def wilson(wins, games, z=1.96):
+	# 95% confidence interval of a win rate, sound even at 0 or 100%
+	if not games:
+		return 0.0, 0.0
+	p = wins / games
+	centre = (p + z * z / (2 * games)) / (1 + z * z / games)
+	spread = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+	return max(0.0, centre - spread), min(1.0, centre + spread)
+
+def make_policy(name, seed, iterations):
+	if name == "mcts":
+		return bots.MCTSPolicy(seed, iterations=iterations)
+	return bots.policies[name](seed)
+
+def play_chunk(chunk):
+	# Returns (won, rooms cleared) per seed, decisions made and CPU seconds
+	master, start, count, difficulty, name, iterations = chunk
+	games = [engine.Game(seed, difficulty) for seed in engine.seed_stream(master, count, start)]
+	policy = make_policy(name, engine.derive_seed(master ^ engine.GOLDEN_GAMMA, start), iterations)
+	begin = time.process_time()
+	decisions = bots.play_batch(games, policy)
+	cpu = time.process_time() - begin
+	return [(game.status == "won", game.current_room - 1) for game in games], decisions, cpu
+
+def evaluate(names, games, difficulty="easy", master=0, jobs=None, chunk_size=100, iterations=100):
+	# Per policy: {"won": [...], "rooms": [...], "decisions": n, "cpu": s},
+	# the lists in seed order
+	work = [
+		(master, start, min(chunk_size, games - start), difficulty, name, iterations)
+		for name in names for start in range(0, games, chunk_size)
+	]
+	results = {name: {"won": [], "rooms": [], "decisions": 0, "cpu": 0.0} for name in names}
+	with contextlib.nullcontext() if jobs == 1 else Pool(jobs) as pool:
+		parts = map(play_chunk, work) if pool is None else pool.imap(play_chunk, work)
+		for (_, _, _, _, name, _), (rows, decisions, cpu) in zip(work, parts):
+			result = results[name]
+			result["won"] += [won for won, _ in rows]
+			result["rooms"] += [rooms for _, rooms in rows]
+			result["decisions"] += decisions
+			result["cpu"] += cpu
+	return results
+
+def report(results):
+	print(f"{'policy':>10} {'win rate':>9} {'95% CI':>17} {'rooms':>6} {'decisions/s/core':>17}")
+	for name, r in results.items():
+		games = len(r["won"])
+		wins = sum(r["won"])
+		low, high = wilson(wins, games)
+		print(
+			f"{name:>10} {wins / games:9.2%} [{low:6.2%}, {high:6.2%}] "
+			f"{sum(r['rooms']) / games:6.2f} {r['decisions'] / max(r['cpu'], 1e-9):17.0f}"
+		)
+	names = list(results)
+	for i, a in enumerate(names):
+		for b in names[i + 1:]:
+			pairs = list(zip(results[a]["won"], results[b]["won"], results[a]["rooms"], results[b]["rooms"]))
+			only_a = sum(wa and not wb for wa, wb, _, _ in pairs)
+			only_b = sum(wb and not wa for wa, wb, _, _ in pairs)
+			further = sum(ra > rb for _, _, ra, rb in pairs) - sum(rb > ra for _, _, ra, rb in pairs)
+			print(f"{a} vs {b}: only {a} won {only_a}, only {b} won {only_b}, {a} got further on {further:+d} seeds net")
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Play bots against each other on the same seeds.")
+	parser.add_argument("--policies", nargs="+", choices=sorted(bots.policies), default=["random", "greedy", "conserve"])
+	parser.add_argument("--games", type=int, default=2000, help="seeds every policy plays")
+	parser.add_argument("--difficulty", choices=engine.difficulties, default="easy")
+	parser.add_argument("--seed", type=int, help="master seed of the seed set (random if omitted)")
+	parser.add_argument("--jobs", type=int, default=os.cpu_count())
+	parser.add_argument("--chunk-size", type=int, default=100, help="games per task, played in lockstep")
+	parser.add_argument("--mcts-iterations", type=int, default=100, help="rollouts per mcts decision")
+	args = parser.parse_args(argv)
+
+	master = args.seed if args.seed is not None else engine.new_seed()
+	start = time.perf_counter()
+	results = evaluate(args.policies, args.games, args.difficulty, master, args.jobs, args.chunk_size, args.mcts_iterations)
+	print(f"Master seed: {master}, {args.games} {args.difficulty} games each, {time.perf_counter() - start:.1f}s")
+	report(results)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,394 @@
+import argparse
+import math
+import os
+import time
+from multiprocessing import Pool
+import numpy as np
+import engine
+import simulate
+
+# Steps K games in lockstep with their state in NumPy arrays. Needs numpy,
+# unlike the rest of the game.
+#
+# Usage: python batch_sim.py --games 1000000 --policy greedy --validate
+
+NCARDS = len(engine.deck_names)
+NACTIONS = 1 + 2 * engine.MAX_ROOM_CARDS
+
+# Card tables with a trailing sentinel, so an empty room slot (-1) looks up
+# a zero-strength card of no suit
+STRENGTH = np.array(engine.card_strength + [0], dtype=np.int16)
+SUIT = np.array(engine.card_suit + [-1], dtype=np.int8)
+MONSTER = np.array(engine.card_is_monster + [False])
+
+PLAYING, WON, LOST = 0, 1, 2
+STATUS = {"playing": PLAYING, "won": WON, "lost": LOST}
+EMPTY = [[-1] * n for n in range(engine.MAX_ROOM_CARDS, -1, -1)]  # padding for a room of len(room) cards
+
+STATE = [
+	"hp", "current_weapon", "last_card_killed", "heal_used", "skipped_last",
+	"played_first_card", "current_room", "status", "deck", "deck_count",
+	"room", "room_count", "highest_weapon", "highest_card_killed",
+	"highest_damage", "highest_heal", "ids"
+]
+
+class BatchGame:
+	def __init__(self, games, difficulty="easy", seed=None, max_hp=20):
+		self.games = games
+		self.size = games
+		self.ids = np.arange(games)
+		self.finished = []
+		self.difficulty = difficulty
+		self.rng = np.random.default_rng(seed)
+		self.max_hp = max_hp
+
+		self.hp = np.zeros(games, dtype=np.int16)
+		self.current_weapon = np.zeros(games, dtype=np.int16)
+		self.last_card_killed = np.zeros(games, dtype=np.int16)
+		self.heal_used = np.zeros(games, dtype=bool)
+		self.skipped_last = np.zeros(games, dtype=bool)
+		self.played_first_card = np.zeros(games, dtype=bool)
+		self.current_room = np.zeros(games, dtype=np.int32)
+		self.status = np.zeros(games, dtype=np.int8)
+
+		self.deck = np.zeros((games, NCARDS), dtype=bool)
+		self.deck_count = np.zeros(games, dtype=np.int64)
+		# Room slots hold card ids in the same order as Room.card_seq, -1 when empty
+		self.room = np.zeros((games, engine.MAX_ROOM_CARDS), dtype=np.int16)
+		self.room_count = np.zeros(games, dtype=np.int16)
+
+		self.highest_weapon = np.zeros(games, dtype=np.int16)
+		self.highest_card_killed = np.zeros(games, dtype=np.int16)
+		self.highest_damage = np.zeros(games, dtype=np.int16)
+		self.highest_heal = np.zeros(games, dtype=np.int16)
+
+		self.reset(self.ids)
+
+	def reset(self, rows):
+		# Starts a new game in each of the given rows
+		self.hp[rows] = self.max_hp
+		self.current_weapon[rows] = 0
+		self.last_card_killed[rows] = 0
+		self.heal_used[rows] = False
+		self.skipped_last[rows] = False
+		self.played_first_card[rows] = False
+		self.current_room[rows] = 1
+		self.status[rows] = PLAYING
+
+		deck = engine.difficulty_decks[self.difficulty]
+		self.deck[rows] = False
+		self.deck[np.ix_(rows, deck)] = True
+		self.deck_count[rows] = len(deck)
+		self.room[rows] = -1
+		self.room_count[rows] = 0
+
+		self.highest_weapon[rows] = 0
+		self.highest_card_killed[rows] = 0
+		self.highest_damage[rows] = 0
+		self.highest_heal[rows] = 0
+
+		self._deal(rows, np.full(len(rows), 4))
+
+	@classmethod
+	def from_games(cls, games, rng=None):
+		# The decision state of some engine.Games, for legal_mask() and the
+		# array policies, not for stepping. Their skips must not be infinite.
+		batch = cls.__new__(cls)
+		batch.games = batch.size = len(games)
+		batch.ids = np.arange(len(games))
+		batch.rng = np.random.default_rng(rng)  # a seed or a Generator to share
+		players = [game.player for game in games]
+		rooms = [game.room for game in games]
+		batch.max_hp = np.array([p.max_hp for p in players], dtype=np.int16)[:, None]
+		batch.hp = np.array([p.hp for p in players], dtype=np.int16)
+		batch.current_weapon = np.array([p.current_weapon for p in players], dtype=np.int16)
+		batch.last_card_killed = np.array([p.last_card_killed for p in players], dtype=np.int16)
+		batch.heal_used = np.array([r.heal_used for r in rooms], dtype=bool)
+		batch.skipped_last = np.array([r.skipped_last for r in rooms], dtype=bool)
+		batch.played_first_card = np.array([r.played_first_card for r in rooms], dtype=bool)
+		batch.status = np.array([STATUS[game.status] for game in games], dtype=np.int8)
+		batch.deck_count = np.array([len(r.deck) for r in rooms], dtype=np.int64)
+		batch.room = np.array([r.card_seq + EMPTY[len(r.card_seq)] for r in rooms], dtype=np.int16).reshape(-1, engine.MAX_ROOM_CARDS)
+		return batch
+
+	@property
+	def active(self):
+		return self.status == PLAYING
+
+	@property
+	def over(self):
+		return not self.active.any()
+
+	def _deal(self, rows, amounts):
+		# Uniform draws without replacement; drawn cards are appended in random
+		# order just like Room.add_cards
+		keys = self.rng.random((len(rows), NCARDS))
+		keys[~self.deck[rows]] = 2.0
+		order = np.argsort(keys, axis=1)[:, :4]
+		for t in range(4):
+			sel = t < amounts
+			r = rows[sel]
+			c = order[sel, t]
+			self.room[r, self.room_count[r]] = c
+			self.room_count[r] += 1
+			self.deck[r, c] = False
+		self.deck_count[rows] -= np.minimum(amounts, 4)
+
+	def can_skip(self):
+		return (self.deck_count > 0) & ~self.skipped_last & ~self.played_first_card
+
+	def weapon_usable(self, strength):
+		# strength is (games, slots), like STRENGTH[self.room]
+		last = self.last_card_killed[:, None]
+		return (self.current_weapon[:, None] > 0) & ((last >= strength) | (last == 0))
+
+	def legal_mask(self):
+		mask = np.zeros((self.games, NACTIONS), dtype=bool)
+		active = self.active
+		mask[:, engine.SKIP] = self.can_skip() & active
+		present = (self.room >= 0) & active[:, None]
+		strength = STRENGTH[self.room]
+		suit = SUIT[self.room]
+		choice = (MONSTER[self.room] & self.weapon_usable(strength)) | ((suit == engine.DIAMONDS) & (self.current_weapon[:, None] > 0))
+		mask[:, 1::2] = present
+		mask[:, 2::2] = present & choice
+		return mask
+
+	def step(self, actions):
+		# actions holds one engine action per game; finished games ignore theirs
+		actions = np.asarray(actions)
+		active = self.active
+		skip = active & (actions == engine.SKIP)
+		picked = active & (actions != engine.SKIP)
+
+		if skip.any():
+			rows = np.flatnonzero(skip)
+			for i in range(engine.MAX_ROOM_CARDS):
+				c = self.room[rows, i]
+				back = c >= 0
+				self.deck[rows[back], c[back]] = True
+			self.deck_count[rows] += self.room_count[rows]
+			self.room[rows] = -1
+			self.room_count[rows] = 0
+			self._deal(rows, np.minimum(4, self.deck_count[rows]))
+			self.skipped_last[rows] = True
+
+		if picked.any():
+			self._pick(np.flatnonzero(picked), actions[picked])
+
+		self._advance(active)
+
+	def _pick(self, rows, actions):
+		index = (actions - 1) // 2
+		use = (actions - 1) % 2 == 0
+		card = self.room[rows, index]
+		strength = STRENGTH[card]
+		suit = SUIT[card]
+		hp = self.hp[rows]
+		weapon = self.current_weapon[rows]
+		last = self.last_card_killed[rows]
+		self.played_first_card[rows] = True
+
+		# Heal
+		heart = suit == engine.HEARTS
+		heal = heart & ~self.heal_used[rows]
+		hp = np.where(heal, np.minimum(hp + strength, self.max_hp), hp)
+		self.heal_used[rows] |= heart
+		self.highest_heal[rows] = np.where(heart, np.maximum(self.highest_heal[rows], strength), self.highest_heal[rows])
+
+		# Deal damage
+		monster = MONSTER[card]
+		with_weapon = monster & use & (weapon > 0) & ((last >= strength) | (last == 0))
+		damage = np.where(with_weapon, np.maximum(0, strength - weapon), strength)
+		damage = np.where(monster, damage, 0)
+		hp = hp - damage
+		last = np.where(with_weapon, strength, last)
+		self.highest_card_killed[rows] = np.where(monster, np.maximum(self.highest_card_killed[rows], strength), self.highest_card_killed[rows])
+		self.highest_damage[rows] = np.maximum(self.highest_damage[rows], damage)
+
+		# Get weapon/discard a weapon
+		diamond = suit == engine.DIAMONDS
+		equip = diamond & (use | (weapon == 0))
+		last = np.where(equip & (weapon > 0), 0, last)
+		weapon = np.where(equip, strength, weapon)
+		self.highest_weapon[rows] = np.where(diamond, np.maximum(self.highest_weapon[rows], strength), self.highest_weapon[rows])
+
+		self.hp[rows] = hp
+		self.current_weapon[rows] = weapon
+		self.last_card_killed[rows] = last
+
+		# Remove card, keeping the remaining ones in order
+		for j in range(engine.MAX_ROOM_CARDS - 1):
+			self.room[rows, j] = self.room[rows, j + (j >= index)]
+		self.room[rows, -1] = -1
+		self.room_count[rows] -= 1
+
+	def _advance(self, active):
+		# Replenish cards when only 1 left
+		advance = active & (self.room_count < 2)
+		deal = advance & (self.deck_count > 0)
+		if deal.any():
+			rows = np.flatnonzero(deal)
+			self._deal(rows, np.minimum(3, self.deck_count[rows]))
+		self.current_room += advance
+		self.skipped_last &= ~advance
+		self.heal_used &= ~advance
+		self.played_first_card &= ~advance
+
+		lost = active & (self.hp <= 0)
+		won = active & ~lost & (self.deck_count == 0) & (self.room_count == 0)
+		self.status[lost] = LOST
+		self.status[won] = WON
+
+	def compact(self):
+		# Drop finished games from the arrays so later steps only pay for the
+		# games still playing; their state is kept aside for results()
+		keep = self.active
+		if keep.all():
+			return
+		self.finished.append({name: getattr(self, name)[~keep] for name in STATE})
+		for name in STATE:
+			setattr(self, name, getattr(self, name)[keep])
+		self.games = len(self.ids)
+
+	def results(self):
+		parts = self.finished + [{name: getattr(self, name) for name in STATE}]
+		ids = np.concatenate([p["ids"] for p in parts])
+		order = np.argsort(ids)
+		def column(name):
+			return np.concatenate([p[name] for p in parts])[order]
+		return {
+			"won": column("status") == WON,
+			"rooms": column("current_room"),
+			"highest_damage": column("highest_damage"),
+			"highest_heal": column("highest_heal"),
+			"highest_weapon": column("highest_weapon"),
+			"highest_card_killed": column("highest_card_killed")
+		}
+
+"""
+#################
+### POLICIES ###
+#################
+"""
+
+# Array versions of the policies in bots.py: each takes a BatchGame and
+# returns one action per game, choosing exactly like its scalar twin.
+
+def random_actions(batch):
+	keys = batch.rng.random((batch.games, NACTIONS))
+	keys[~batch.legal_mask()] = -1.0
+	return keys.argmax(axis=1)
+
+def action_costs(batch):
+	strength = STRENGTH[batch.room]
+	suit = SUIT[batch.room]
+	monster = MONSTER[batch.room]
+	weapon = batch.current_weapon[:, None]
+	hp = batch.hp[:, None]
+
+	use_cost = np.where(batch.weapon_usable(strength), np.maximum(0, strength - weapon), strength)
+	keep_cost = strength.copy()
+
+	heal = np.where(batch.heal_used[:, None], 0, -np.minimum(strength, batch.max_hp - hp))
+	heart = suit == engine.HEARTS
+	use_cost = np.where(heart, heal, use_cost)
+	keep_cost = np.where(heart, heal, keep_cost)
+
+	diamond = suit == engine.DIAMONDS
+	use_cost = np.where(diamond, weapon - strength, use_cost)
+	keep_cost = np.where(diamond, np.where(weapon == 0, weapon - strength, 0), keep_cost)
+
+	costs = np.zeros((batch.games, NACTIONS), dtype=np.int16)
+	costs[:, 1::2] = np.where(monster | heart | diamond, use_cost, 0)
+	costs[:, 2::2] = np.where(monster | heart | diamond, keep_cost, 0)
+	return costs
+
+def greedy_actions(batch):
+	mask = batch.legal_mask()
+	monsters = np.where(MONSTER[batch.room], STRENGTH[batch.room], 0).sum(axis=1)
+	skip = mask[:, engine.SKIP] & (monsters >= batch.hp)
+	costs = np.where(mask, action_costs(batch), np.iinfo(np.int16).max)
+	costs[:, engine.SKIP] = np.iinfo(np.int16).max
+	return np.where(skip, engine.SKIP, costs.argmin(axis=1))
+
+batch_policies = {"random": random_actions, "greedy": greedy_actions}
+
+def play(batch, policy):
+	choose = batch_policies[policy]
+	while not batch.over:
+		batch.step(choose(batch))
+		if batch.active.sum() * 2 < batch.games:
+			batch.compact()
+	return batch.results()
+
+"""
+#############
+### RUNNER ###
+#############
+"""
+
+def play_batch(args):
+	games, difficulty, policy, seed = args
+	return play(BatchGame(games, difficulty, seed), policy)
+
+def run(games, difficulty="easy", policy="greedy", master=0, jobs=None, batch_size=20000):
+	# One BatchGame per batch_size games, seeded from the master stream
+	work = []
+	for i, start in enumerate(range(0, games, batch_size)):
+		work.append((min(batch_size, games - start), difficulty, policy, engine.derive_seed(master, i)))
+	if jobs == 1:
+		parts = [play_batch(w) for w in work]
+	else:
+		with Pool(jobs) as pool:
+			parts = pool.map(play_batch, work)
+	return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+def scalar_results(games, difficulty, policy, master, jobs):
+	rows = np.array(list(simulate.run(games, difficulty, policy, master, jobs)), dtype=np.int64)
+	return {name: rows[:, i] for i, name in enumerate(simulate.FIELDS) if name != "seed"}
+
+def compare(batch, scalar):
+	# z-scores of the difference in win rate and in mean of every stat; games
+	# are independent, so |z| above ~4 means the engines disagree
+	scores = {}
+	for name in batch:
+		a = batch[name].astype(float)
+		b = scalar[name].astype(float)
+		se = math.sqrt(a.var() / len(a) + b.var() / len(b))
+		diff = a.mean() - b.mean()
+		scores[name] = (a.mean(), b.mean(), diff / se if se > 0 else (0.0 if diff == 0 else math.inf))
+	return scores
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Play many games in lockstep with NumPy.")
+	parser.add_argument("--games", type=int, default=100000)
+	parser.add_argument("--difficulty", choices=engine.difficulties, default="easy")
+	parser.add_argument("--policy", choices=sorted(batch_policies), default="greedy")
+	parser.add_argument("--seed", type=int)
+	parser.add_argument("--jobs", type=int, default=os.cpu_count())
+	parser.add_argument("--batch-size", type=int, default=20000)
+	parser.add_argument("--validate", action="store_true", help="also run the scalar engine and compare the outcome distributions")
+	args = parser.parse_args(argv)
+
+	master = args.seed if args.seed is not None else engine.new_seed()
+	start = time.perf_counter()
+	results = run(args.games, args.difficulty, args.policy, master, args.jobs, args.batch_size)
+	elapsed = time.perf_counter() - start
+	print(f"Master seed: {master}")
+	print(f"Games: {args.games}  Wins: {results['won'].sum()} ({results['won'].mean():.2%})  Mean rooms: {results['rooms'].mean():.2f}")
+	print(f"Batch: {args.games / elapsed:.0f} games/s on {args.jobs} jobs")
+
+	if args.validate:
+		start = time.perf_counter()
+		scalar = scalar_results(args.games, args.difficulty, args.policy, master, args.jobs)
+		elapsed_scalar = time.perf_counter() - start
+		print(f"Scalar: {args.games / elapsed_scalar:.0f} games/s on {args.jobs} jobs ({elapsed_scalar / elapsed:.1f}x slower)")
+		worst = 0.0
+		for name, (a, b, z) in compare(results, scalar).items():
+			print(f"  {name:20} batch {a:8.3f}  scalar {b:8.3f}  z {z:+.2f}")
+			worst = max(worst, abs(z))
+		print("Distributions match" if worst < 4 else "Distributions DIFFER")
+
+if __name__ == "__main__":
+	main()
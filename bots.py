@@ -0,0 +1,208 @@
+import random
+import engine
+from engine import card_strength, card_suit, card_is_monster, HEARTS
+
+"""
+################
+#### POLICIES ####
+################
+"""
+
+class Policy:
+	name = ""
+
+	def __init__(self, seed=None, tablebase=None):
+		self.rng = random.Random(seed)
+		self.tablebase = tablebase  # see tablebase.py; policies may ignore it
+
+	def choose(self, game):
+		raise NotImplementedError
+
+	def choose_batch(self, games):
+		# One action per game; policies that can share work across games
+		# override this
+		return [self.choose(game) for game in games]
+
+
+# Fewer games than this are quicker one at a time
+ARRAY_MIN = {"random": 64, "greedy": 32}
+
+def array_actions(games, policy, rng=None):
+	# One action per game from batch_sim's NumPy twin of the policy, all
+	# games at once, or None where that doesn't pay or can't be used (no
+	# numpy, infinite skips). rng is a NumPy Generator, for "random".
+	if len(games) < ARRAY_MIN[policy]:
+		return None
+	try:
+		import batch_sim
+	except ImportError:
+		return None
+	if any(game.infinite_skips for game in games):
+		return None
+	batch = batch_sim.BatchGame.from_games(games, rng)
+	return batch_sim.batch_policies[policy](batch).tolist()
+
+
+class RandomPolicy(Policy):
+	name = "random"
+	generator = None  # NumPy's, for choose_batch
+
+	def choose(self, game):
+		return self.rng.choice(game.legal_actions())
+
+	def choose_batch(self, games):
+		if self.generator is None:
+			try:
+				import numpy as np
+			except ImportError:
+				return super().choose_batch(games)
+			self.generator = np.random.default_rng(self.rng.getrandbits(64))
+		actions = array_actions(games, "random", self.generator)
+		return super().choose_batch(games) if actions is None else actions
+
+
+def action_cost(game, action):
+	# HP this action costs right now (negative when it gains something)
+	player = game.player
+	if action == engine.SKIP:
+		return 0
+	index, use = engine.decode(action)
+	card = game.room.card_seq[index]
+	strength = card_strength[card]
+
+	if card_is_monster[card]:
+		if use and game.weapon_usable(strength):
+			return max(0, strength - player.current_weapon)
+		return strength
+	if card_suit[card] == HEARTS:
+		if game.room.heal_used:
+			return 0
+		return -min(strength, player.max_hp - player.hp)
+	if use or player.current_weapon == 0:
+		return player.current_weapon - strength
+	return 0
+
+
+class GreedyPolicy(Policy):
+	# Takes whatever costs the least HP right now, skipping rooms whose
+	# monsters add up to more than the HP left. With an endgame tablebase it
+	# plays a known win once the deck is empty.
+	name = "greedy"
+
+	def choose(self, game):
+		if self.tablebase:
+			action = self.tablebase.best_action(game)
+			if action is not None:
+				return action
+		actions = game.legal_actions()
+		if engine.SKIP in actions:
+			room = game.room.card_seq
+			if sum(card_strength[c] for c in room if card_is_monster[c]) >= game.player.hp:
+				return engine.SKIP
+			actions.remove(engine.SKIP)
+		return min(actions, key=lambda a: action_cost(game, a))
+
+	def choose_batch(self, games):
+		actions = array_actions(games, "greedy")
+		if actions is None:
+			return super().choose_batch(games)
+		if self.tablebase:
+			for i, game in enumerate(games):
+				if not game.room.deck:
+					action = self.tablebase.best_action(game)
+					if action is not None:
+						actions[i] = action
+		return actions
+
+
+def weapon_reach(weapon, last):
+	# Strongest monster the weapon still cuts down
+	if weapon == 0:
+		return 0
+	return last if last else 14
+
+
+class ConservePolicy(Policy):
+	# Greedy, but a weapon is worth what it will still kill: hitting a weak
+	# monster with it lowers last_card_killed, and every stronger monster
+	# still to come then gets through at full strength. So it fights the
+	# strongest monsters first, leaves weak ones to bare hands when the
+	# weapon has more to give, and only swaps weapons for a better one.
+	name = "conserve"
+
+	def monsters_left(self, game, index):
+		room = game.room
+		return [card_strength[c] for c in room.deck if card_is_monster[c]] + [
+			card_strength[c] for i, c in enumerate(room.card_seq) if i != index and card_is_monster[c]
+		]
+
+	def weapon_value(self, weapon, last, monsters):
+		# HP the weapon saves against the monsters left
+		reach = weapon_reach(weapon, last)
+		return sum(min(weapon, m) for m in monsters if m <= reach)
+
+	def cost(self, game, action):
+		player = game.player
+		index, use = engine.decode(action)
+		card = game.room.card_seq[index]
+		strength = card_strength[card]
+		weapon, last = player.current_weapon, player.last_card_killed
+		if card_is_monster[card] and use and game.weapon_usable(strength):
+			monsters = self.monsters_left(game, index)
+			lost = self.weapon_value(weapon, last, monsters) - self.weapon_value(weapon, strength, monsters)
+			return max(0, strength - weapon) + lost / 2
+		if card_suit[card] == engine.DIAMONDS and weapon and use:
+			monsters = self.monsters_left(game, index)
+			return (self.weapon_value(weapon, last, monsters) - self.weapon_value(strength, 0, monsters)) / 2
+		return action_cost(game, action)
+
+	def choose(self, game):
+		if self.tablebase:
+			action = self.tablebase.best_action(game)
+			if action is not None:
+				return action
+		actions = game.legal_actions()
+		if engine.SKIP in actions:
+			room = game.room.card_seq
+			if sum(card_strength[c] for c in room if card_is_monster[c]) >= game.player.hp:
+				return engine.SKIP
+			actions.remove(engine.SKIP)
+		return min(actions, key=lambda a: self.cost(game, a))
+
+
+class MCTSPolicy(Policy):
+	# Determinised Monte Carlo tree search (see mcts.py), `iterations`
+	# rollouts per decision
+	name = "mcts"
+
+	def __init__(self, seed=None, tablebase=None, iterations=200):
+		super().__init__(seed, tablebase)
+		import mcts
+		self.search = mcts.MCTS(seed=self.rng.getrandbits(64), tablebase=tablebase)
+		self.iterations = iterations
+
+	def choose(self, game):
+		actions = game.legal_actions()
+		if len(actions) == 1:
+			return actions[0]
+		root = self.search.search(game, self.iterations)
+		return self.search.best(root, actions)[0]
+
+
+policies = {p.name: p for p in [RandomPolicy, GreedyPolicy, ConservePolicy, MCTSPolicy]}
+
+def play(game, policy):
+	while not game.over:
+		game.step(policy.choose(game))
+	return game
+
+def play_batch(games, policy):
+	# Plays the games in lockstep, asking the policy for all of them at once
+	playing = [game for game in games if not game.over]
+	decisions = 0
+	while playing:
+		for game, action in zip(playing, policy.choose_batch(playing)):
+			game.step(action)
+		decisions += len(playing)
+		playing = [game for game in playing if not game.over]
+	return decisions
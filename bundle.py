@@ -0,0 +1,142 @@
+import argparse
+import importlib.util
+import marshal
+import os
+import re
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+# The browser build. index.html ships every module as a source file, and
+# Pyodide compiles them all again on each visit. `build` puts the same
+# modules into one archive, dist/scoundrel.zip, each as source plus
+# bytecode, with the card art tables already generated (cards_art.py, which
+# cards_ascii.py picks up when it's there). It also writes dist/index.html,
+# which fetches just that archive and starts the game through dist/boot.py.
+#
+# The bytecode is stored as unchecked hash-based .pyc files, which zipimport
+# loads without looking at the source. Build it with the Python version
+# Pyodide runs: with any other, zipimport rejects the bytecode and falls back
+# to compiling the sources beside it, which still works, just slower.
+#
+# `bench` times `import scoundrel` under CPython in fresh processes, from
+# the loose sources compiled every time (what the browser does without the
+# bundle) and from the archive.
+#
+# Usage: python bundle.py build && python bundle.py bench
+
+BOOT = """import builtins
+import sys
+
+# The game, precompiled, from the archive bundle.py built
+sys.path.insert(0, "scoundrel.zip")
+if "__terminal__" in globals():
+	# clean() looks the PyScript terminal up from inside the module
+	builtins.__terminal__ = __terminal__
+import scoundrel
+scoundrel.main()
+"""
+
+def shipped_modules(html):
+	# The .py files index.html's py-config fetches, in its order
+	with open(html) as f:
+		return re.findall(r'^\s*"(\w+\.py)"\s*=', f.read(), re.MULTILINE)
+
+def card_art_source():
+	import cards_ascii
+	return (
+		"# Generated by bundle.py from cards_ascii.py, do not edit\n"
+		f"cards_ascii = {tuple(cards_ascii.cards_ascii)!r}\n"
+		f"card_lines = {tuple(cards_ascii.card_lines)!r}\n"
+	)
+
+def pyc(source, filename):
+	# Unchecked hash-based bytecode (PEP 552): loaded without reading the source
+	data = source.encode()
+	code = compile(data, filename, "exec", dont_inherit=True)
+	return importlib.util.MAGIC_NUMBER + struct.pack("<I", 0b01) + importlib.util.source_hash(data) + marshal.dumps(code)
+
+def build_archive(path, sources):
+	# sources: {filename: source}. Stored uncompressed, for the quickest
+	# imports; the server compresses the download.
+	with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+		for name, source in sources.items():
+			archive.writestr(name, source)
+			archive.writestr(name + "c", pyc(source, name))
+
+def build(out, html="index.html"):
+	sources = {}
+	for name in shipped_modules(html):
+		with open(name) as f:
+			sources[name] = f.read()
+	sources["cards_art.py"] = card_art_source()
+	os.makedirs(out, exist_ok=True)
+	build_archive(os.path.join(out, "scoundrel.zip"), sources)
+	with open(os.path.join(out, "boot.py"), "w") as f:
+		f.write(BOOT)
+
+	with open(html) as f:
+		page = f.read()
+	page = re.sub(r"\[files\].*?(?=\s*</py-config>)", '[files]\n      "scoundrel.zip" = "scoundrel.zip"', page, flags=re.DOTALL)
+	page = page.replace('src="scoundrel.py"', 'src="boot.py"')
+	with open(os.path.join(out, "index.html"), "w") as f:
+		f.write(page)
+
+	size = sum(len(s.encode()) for s in sources.values())
+	print(f"{out}/scoundrel.zip: {len(sources)} modules, {os.path.getsize(os.path.join(out, 'scoundrel.zip'))} bytes ({size} bytes of source)")
+
+"""
+#################
+### BENCHMARK ###
+#################
+"""
+
+IMPORT = "import sys, time\nsys.path.insert(0, {!r})\nstart = time.perf_counter()\nimport scoundrel\nprint(time.perf_counter() - start)\n"
+
+def time_import(path, cwd):
+	# -I keeps the repo (and its __pycache__) off the path, -B writes no cache
+	result = subprocess.run(
+		[sys.executable, "-I", "-B", "-c", IMPORT.format(path)],
+		cwd=cwd, capture_output=True, text=True, check=True,
+	)
+	return float(result.stdout)
+
+def bench(runs, html="index.html"):
+	with tempfile.TemporaryDirectory() as tmp:
+		loose = os.path.join(tmp, "loose")
+		os.makedirs(loose)
+		for name in shipped_modules(html):
+			shutil.copy(name, loose)
+		build(os.path.join(tmp, "dist"), html)
+		archive = os.path.join(tmp, "dist", "scoundrel.zip")
+
+		cases = {"sources, compiled on load": (loose, []), "bundle": (archive, [])}
+		for _ in range(runs):
+			# Interleaved, so both see the same machine load
+			for path, times in cases.values():
+				times.append(time_import(path, tmp))
+		for name, (_, times) in cases.items():
+			print(f"{name:>26}: median {statistics.median(times) * 1000:6.2f} ms, best {min(times) * 1000:6.2f} ms")
+		before = statistics.median(cases["sources, compiled on load"][1])
+		after = statistics.median(cases["bundle"][1])
+		print(f"{before / after:.1f}x faster import of scoundrel over {runs} runs")
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Build the precompiled browser bundle, or time importing the game.")
+	commands = parser.add_subparsers(dest="command", required=True)
+	build_parser = commands.add_parser("build", help="write the bundle, boot script and page")
+	build_parser.add_argument("--out", default="dist")
+	bench_parser = commands.add_parser("bench", help="time `import scoundrel` from sources and from the bundle")
+	bench_parser.add_argument("--runs", type=int, default=20)
+	args = parser.parse_args(argv)
+	if args.command == "build":
+		build(args.out)
+	else:
+		bench(args.runs)
+
+if __name__ == "__main__":
+	main()
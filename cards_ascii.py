@@ -1,5 +1,6 @@
 
-import shutil
+from functools import lru_cache
+import screen
 
 card_values = {
 	"2": 2, "3": 3, "4": 4, "5": 5, "6": 6, "7": 7,
@@ -39,84 +40,93 @@ class colors:
 	green = '\033[0;32;40m'
 	end = '\033[0m'
 
-def return_ascii_card(rank: str, suit: str):
-
-	spades = f"""
+# Card art templates, one per suit, filled in with the rank
+card_templates = {
+	"spades": f"""
 .------.
-|{rank}.--. |
-| :{colors.dark_blue}/\{colors.end}: |
+|{{rank}}.--. |
+| :{colors.dark_blue}/\\{colors.end}: |
 | {colors.dark_blue}(__){colors.end} |
-| '--'{rank}|
+| '--'{{rank}}|
 `------'
-"""
-
-	hearts = f"""
+""",
+	"hearts": f"""
 .------.
-|{rank}.--. |
-|{colors.red} (\/) {colors.end}|
-| :{colors.red}\/{colors.end}: |
-| '--'{rank}|
+|{{rank}}.--. |
+|{colors.red} (\\/) {colors.end}|
+| :{colors.red}\\/{colors.end}: |
+| '--'{{rank}}|
 `------'
-"""
-
-	clubs = f"""
+""",
+	"clubs": f"""
 .------.
-|{rank}.--. |
+|{{rank}}.--. |
 | :{colors.yellow}(){colors.end}: |
 | {colors.yellow}()(){colors.end} |
-| '--'{rank}|
+| '--'{{rank}}|
 `------'
-"""
-
-	diamonds = f"""
+""",
+	"diamonds": f"""
 .------.
-|{rank}.--. |
-| :{colors.green}/\{colors.end}: |
-| :{colors.green}\/{colors.end}: |
-| '--'{rank}|
+|{{rank}}.--. |
+| :{colors.green}/\\{colors.end}: |
+| :{colors.green}\\/{colors.end}: |
+| '--'{{rank}}|
 `------'
 """
-	cards_dict = {
-		"spades": spades,
-		"hearts": hearts,
-		"diamonds": diamonds,
-		"clubs": clubs
-	}
-
-	return cards_dict[suit]
-
-cards_ascii = []
-cards_name_to_ascii = {}
+}
 
-for c in deck_names:
-	cards_ascii.append(return_ascii_card(deck[c].rank, deck[c].suit) if deck[c].rank != "10" else return_ascii_card("T", deck[c].suit))
-	
-	cards_name_to_ascii[c] = return_ascii_card(deck[c].rank, deck[c].suit) if deck[c].rank != "10" else return_ascii_card("T", deck[c].suit)
+def return_ascii_card(rank: str, suit: str):
+	return card_templates[suit].format(rank=rank)
+
+# Built once: the art as a string and as its lines, in deck_names order
+try:
+	# Generated ahead of time in the browser build, see bundle.py
+	from cards_art import cards_ascii, card_lines
+	cards_ascii, card_lines = list(cards_ascii), list(card_lines)
+except ImportError:
+	cards_ascii = []
+	card_lines = []
+	for c in deck_names:
+		art = return_ascii_card(deck[c].rank if deck[c].rank != "10" else "T", deck[c].suit)
+		cards_ascii.append(art)
+		card_lines.append(tuple(art.splitlines()))
+
+cards_name_to_ascii = dict(zip(deck_names, cards_ascii))
+ascii_to_index = {art: i for i, art in enumerate(cards_ascii)}
+
+card_width = 8
+spacing = 2
+
+@lru_cache(maxsize=512)
+def render_cards(cards, width):
+	# Lines showing the cards (a tuple of deck_names indices) side by side,
+	# wrapped to `width` columns. Memoised: a room is drawn many times.
+	cards_per_line = max(1, width // (card_width + spacing))
+	lines = []
+	for start in range(0, len(cards), cards_per_line):
+		if start:
+			lines.append("")
+		row = [card_lines[c] for c in cards[start:start + cards_per_line]]
+		lines.extend("  ".join(card_lines) for card_lines in zip(*row))
+	return tuple(lines)
+
+rendered_width = None
+
+def render_cards_side_by_side(cards, width=None):
+	# Lines for the cards (deck_names indices) at the terminal's width
+	global rendered_width
+	if not cards:
+		return ()
+	if width is None:
+		width = screen.terminal_size().columns
+		if width != rendered_width:
+			# Rows for the old width won't be asked for again
+			render_cards.cache_clear()
+			rendered_width = width
+	return render_cards(tuple(cards), width)
 
 def print_cards_side_by_side(cards):
-	if not cards:
-		return
-	
-	# Get terminal width
-	terminal_width = shutil.get_terminal_size().columns
-	
-	card_width = 8
-	spacing = 2
-	cards_per_line = max(1, terminal_width // (card_width + spacing))
-	
-	# Split cards into rows
-	rows = []
-	for i in range(0, len(cards), cards_per_line):
-		rows.append(cards[i:i + cards_per_line])
-	
-	# Print row
-	for row in rows:
-		# Split each card into lines
-		split_cards = [card.splitlines() for card in row]
-		
-		# Zip lines together and print them
-		for lines in zip(*split_cards):
-			print("  ".join(lines))
-		
-		if row != rows[-1]:
-			print()
\ No newline at end of file
+	# cards are art strings from cards_ascii
+	for line in render_cards_side_by_side([ascii_to_index[card] for card in cards]):
+		print(line)
@@ -0,0 +1,227 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from multiprocessing import Pool
+import numpy as np
+import engine
+import bots
+import solver
+from seed_search import Deal
+from engine import card_strength, card_suit, card_is_monster, HEARTS, DIAMONDS
+
+# A catalogue of seeds and their deal features, so picking seeds is a lookup
+# instead of a rescan. Needs numpy, like batch_sim.py.
+#
+# A catalogue is a directory holding one .npy file per column plus meta.json.
+# Columns are opened memory-mapped, so a query only touches the pages it
+# reads. Every scalar column also has an index: the row numbers sorted by the
+# column (<column>.order.npy) and the values in that order (<column>.sorted.npy),
+# so a range is two binary searches.
+#
+#   seed                the seed
+#   room1 .. roomN      monster strength dealt into room k when nobody skips
+#   hearts, diamonds    bit i set when the i-th card dealt is a heart/diamond
+#   first_heart         position of the first heart dealt (likewise diamond)
+#   greedy_rooms        rooms the greedy bot clears
+#   winnable            1 if the solver can win it, 0 if not, -1 if not solved
+#   hp_left             the solver's best HP left at the end, -1 if not solved
+#   win_probability     how often daily.rate's MCTS bot, which can't see the
+#                       deal, wins it; NaN if not solved
+#
+# The solver columns take seconds per seed, so they're only filled with --solve.
+#
+# Usage: python catalogue.py build --difficulty normal --count 1000000 --out normal.cat
+#        python catalogue.py query normal.cat --where greedy_rooms=10: --where room1=:12
+
+MASKS = ["hearts", "diamonds"]
+
+def room_count(difficulty):
+	return 1 + math.ceil((len(engine.difficulty_decks[difficulty]) - 4) / 3)
+
+def schema(difficulty):
+	# (column, dtype, value when unknown)
+	rooms = [(f"room{k}", np.uint8, 0) for k in range(1, room_count(difficulty) + 1)]
+	return [("seed", np.int64, 0)] + rooms + [
+		("hearts", np.uint64, 0), ("diamonds", np.uint64, 0),
+		("first_heart", np.uint8, 255), ("first_diamond", np.uint8, 255),
+		("greedy_rooms", np.uint8, 0), ("winnable", np.int8, -1),
+		("hp_left", np.int8, -1), ("win_probability", np.float32, np.nan)
+	]
+
+def features(seed, difficulty, solve=False):
+	cards = Deal(seed, difficulty).rooms(52)
+	rooms = [0] * room_count(difficulty)
+	hearts = diamonds = 0
+	for i, card in enumerate(cards):
+		if card_is_monster[card]:
+			rooms[(i - 1) // 3 if i >= 4 else 0] += card_strength[card]
+		elif card_suit[card] == HEARTS:
+			hearts |= 1 << i
+		elif card_suit[card] == DIAMONDS:
+			diamonds |= 1 << i
+
+	game = engine.Game(seed, difficulty)
+	bots.play(game, bots.GreedyPolicy(engine.splitmix64(seed)))
+	greedy_rooms = game.current_room - 1
+
+	winnable, hp_left, win_probability = -1, -1, math.nan
+	if solve:
+		import daily
+		found = solver.SeedSolver(seed, difficulty)
+		hp_left = found.solve()
+		winnable = int(hp_left > 0)
+		win_probability = daily.rate(found, seed=seed)[0] if winnable else 0.0
+	return (
+		seed, *rooms, hearts, diamonds,
+		(hearts & -hearts).bit_length() - 1 if hearts else 255,
+		(diamonds & -diamonds).bit_length() - 1 if diamonds else 255,
+		greedy_rooms, winnable, hp_left, win_probability
+	)
+
+def build_chunk(chunk):
+	start, count, difficulty, solve = chunk
+	rows = [features(seed, difficulty, solve) for seed in range(start, start + count)]
+	return [np.array(column, dtype=dtype) for column, (_, dtype, _) in zip(zip(*rows), schema(difficulty))]
+
+def build(path, difficulty, start, count, solve=False, jobs=None, chunk_size=2000):
+	os.makedirs(path, exist_ok=True)
+	columns = schema(difficulty)
+	files = {
+		name: np.lib.format.open_memmap(os.path.join(path, name + ".npy"), mode="w+", dtype=dtype, shape=(count,))
+		for name, dtype, _ in columns
+	}
+	work = [(s, min(chunk_size, start + count - s), difficulty, solve) for s in range(start, start + count, chunk_size)]
+	pool = Pool(jobs) if jobs != 1 else None
+	try:
+		results = pool.imap(build_chunk, work) if pool else map(build_chunk, work)
+		for (s, n, _, _), arrays in zip(work, results):
+			for (name, _, _), array in zip(columns, arrays):
+				files[name][s - start:s - start + n] = array
+	finally:
+		if pool:
+			pool.close()
+			pool.join()
+
+	indexed = [name for name, _, _ in columns if name not in MASKS and name != "seed"]
+	for name in indexed:
+		values = files[name]
+		order = np.argsort(values, kind="stable").astype(np.uint32 if count < 1 << 32 else np.int64)
+		np.save(os.path.join(path, name + ".order.npy"), order)
+		np.save(os.path.join(path, name + ".sorted.npy"), values[order])
+	for array in files.values():
+		array.flush()
+	with open(os.path.join(path, "meta.json"), "w") as f:
+		json.dump({
+			"difficulty": difficulty, "start": start, "rows": count, "solved": solve,
+			"columns": [name for name, _, _ in columns], "indexed": indexed
+		}, f, indent=1)
+
+class Catalogue:
+	def __init__(self, path):
+		with open(os.path.join(path, "meta.json")) as f:
+			self.meta = json.load(f)
+		self.path = path
+		self.difficulty = self.meta["difficulty"]
+		self.rows = self.meta["rows"]
+		self.columns = {name: self.open(name) for name in self.meta["columns"]}
+		self.indexes = {name: (self.open(name + ".order"), self.open(name + ".sorted")) for name in self.meta["indexed"]}
+
+	def open(self, name):
+		return np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r")
+
+	def span(self, name, low, high):
+		# Positions in the column's sorted index holding low <= value <= high.
+		# The bounds are cast to the column's type first: a wider key would
+		# make searchsorted convert the whole column.
+		values = self.indexes[name][1]
+		if np.issubdtype(values.dtype, np.integer):
+			info = np.iinfo(values.dtype)
+			if low is not None:
+				low = min(max(math.ceil(low), info.min), info.max + 1)
+			if high is not None:
+				high = max(min(math.floor(high), info.max), info.min - 1)
+			if (low is not None and low > info.max) or (high is not None and high < info.min):
+				return 0, 0
+		cast = values.dtype.type
+		first = 0 if low is None else np.searchsorted(values, cast(low), "left")
+		last = len(values) if high is None else np.searchsorted(values, cast(high), "right")
+		return first, max(first, last)
+
+	def query(self, **ranges):
+		# Row numbers where every column is within its (low, high) range, both
+		# ends inclusive and None for open. The narrowest indexed range is read
+		# from its index and the others are checked on just those rows.
+		for name in ranges:
+			if name not in self.columns:
+				raise ValueError(f"Unknown column: {name}")
+		spans = {name: self.span(name, *r) for name, r in ranges.items() if name in self.indexes}
+		if spans:
+			name = min(spans, key=lambda n: spans[n][1] - spans[n][0])
+			first, last = spans[name]
+			rows = np.sort(self.indexes[name][0][first:last])
+		else:
+			name = None
+			rows = np.arange(self.rows)
+		for other, (low, high) in ranges.items():
+			if other == name or not len(rows):
+				continue
+			values = self.columns[other][rows]
+			keep = np.ones(len(rows), dtype=bool)
+			if low is not None:
+				keep &= values >= low
+			if high is not None:
+				keep &= values <= high
+			rows = rows[keep]
+		return rows
+
+	def seeds(self, **ranges):
+		return self.columns["seed"][self.query(**ranges)]
+
+def parse_range(spec):
+	# "column=low:high", either end may be left out; "column=value" is exact
+	name, _, bounds = spec.partition("=")
+	low, colon, high = bounds.partition(":")
+	if not colon:
+		high = low
+	number = lambda s: float(s) if s else None
+	return name.strip(), (number(low), number(high))
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Build or query a catalogue of seeds and their deal features.")
+	sub = parser.add_subparsers(dest="command", required=True)
+	make = sub.add_parser("build")
+	make.add_argument("--out", required=True, help="catalogue directory")
+	make.add_argument("--difficulty", choices=engine.difficulties, default="easy")
+	make.add_argument("--start", type=int, default=0, help="first seed")
+	make.add_argument("--count", type=int, default=100000)
+	make.add_argument("--solve", action="store_true", help="fill the solver columns (seconds per seed)")
+	make.add_argument("--jobs", type=int, default=os.cpu_count())
+	make.add_argument("--chunk-size", type=int, default=2000, help="seeds per task sent to a worker")
+	find = sub.add_parser("query")
+	find.add_argument("catalogue")
+	find.add_argument("--where", action="append", default=[], metavar="COLUMN=LOW:HIGH")
+	find.add_argument("--show", type=int, default=20, help="seeds to print")
+	args = parser.parse_args(argv)
+
+	if args.command == "build":
+		sys.setrecursionlimit(10000)
+		start = time.perf_counter()
+		build(args.out, args.difficulty, args.start, args.count, args.solve, args.jobs, args.chunk_size)
+		elapsed = time.perf_counter() - start
+		print(f"{args.count} seeds catalogued in {elapsed:.1f}s ({args.count / elapsed:.0f}/s on {args.jobs} jobs)")
+		return
+
+	catalogue = Catalogue(args.catalogue)
+	ranges = dict(parse_range(spec) for spec in args.where)
+	start = time.perf_counter()
+	seeds = catalogue.seeds(**ranges)
+	elapsed = time.perf_counter() - start
+	for seed in seeds[:args.show]:
+		print(seed)
+	print(f"{len(seeds)} of {catalogue.rows} seeds in {elapsed * 1000:.2f} ms", file=sys.stderr)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,146 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import engine
+import bots
+import solver
+
+# Daily challenge seeds. Each day and difficulty gets the first seed of its
+# stream that the solver can win, rated ahead of time:
+#
+#   winnable          always true for a published seed
+#   win_probability   how often the MCTS bot, which knows the rules and
+#                     the cards left but not their order, wins it (see
+#                     rate())
+#   expected_rooms    rooms that bot clears on average
+#
+# Ratings live in a JSON cache file with an expiry per entry, refreshed by
+# `python daily.py` (server.py runs it in the background), so serving one is
+# a dict lookup.
+#
+# Usage: python daily.py --days 3
+
+DAILY_MASTER = 0x5C0DD417
+CACHE_FILE = "daily_cache.json"
+MAX_CANDIDATES = 64
+KEEP_DAYS = 7
+
+def today():
+	return datetime.date.today()
+
+def candidates(day, difficulty):
+	master = engine.splitmix64(DAILY_MASTER + engine.difficulties.index(difficulty))
+	return engine.seed_stream(master, MAX_CANDIDATES, day.toordinal() * MAX_CANDIDATES)
+
+def rate(found, runs=20, iterations=50, seed=0):
+	# Plays the seed `runs` times with bots.MCTSPolicy. Its search deals the
+	# unseen cards at random, so unlike the solver it can't see what's coming
+	# and the rating says how hard the deal is to play, not to solve.
+	rng = random.Random(seed)
+	wins = rooms = 0
+	for _ in range(runs):
+		game = engine.Game(found.seed, found.difficulty, found.max_hp)
+		bots.play(game, bots.MCTSPolicy(rng.getrandbits(64), iterations=iterations))
+		wins += game.status == "won"
+		rooms += game.current_room - 1
+	return wins / runs, rooms / runs
+
+def compute(day, difficulty):
+	for seed in candidates(day, difficulty):
+		found = solver.SeedSolver(seed, difficulty)
+		if found.solve():
+			win_probability, expected_rooms = rate(found, seed=seed)
+			return {
+				"date": day.isoformat(), "difficulty": difficulty, "seed": seed,
+				"winnable": True, "max_hp_left": found.best,
+				"win_probability": round(win_probability, 3),
+				"expected_rooms": round(expected_rooms, 2),
+				"expires": (day + datetime.timedelta(days=KEEP_DAYS)).isoformat()
+			}
+	return None
+
+class DailyCache:
+	# Entries keyed "<date>/<difficulty>". Reads reload the file only when it
+	# has changed, so a server sees the background job's results.
+	def __init__(self, path=CACHE_FILE):
+		self.path = path
+		self.entries = {}
+		self.mtime = None
+		self.lock = threading.Lock()
+
+	def load(self):
+		try:
+			mtime = os.stat(self.path).st_mtime_ns
+		except OSError:
+			return
+		if mtime != self.mtime:
+			with self.lock, open(self.path) as f:
+				self.entries = json.load(f)
+				self.mtime = mtime
+
+	def get(self, day, difficulty):
+		self.load()
+		return self.entries.get(f"{day.isoformat()}/{difficulty}")
+
+	def put(self, entry):
+		self.entries[f"{entry['date']}/{entry['difficulty']}"] = entry
+
+	def expire(self, day):
+		self.entries = {k: e for k, e in self.entries.items() if e["expires"] >= day.isoformat()}
+
+	def save(self):
+		# Written aside and renamed, so readers never see half a file
+		tmp = f"{self.path}.{os.getpid()}.tmp"
+		with open(tmp, "w") as f:
+			json.dump(self.entries, f, indent=1, sort_keys=True)
+		os.replace(tmp, self.path)
+
+def refresh(path=CACHE_FILE, days=2):
+	# Rates today and the next days - 1 days, skipping what's cached
+	cache = DailyCache(path)
+	cache.load()
+	start = today()
+	cache.expire(start)
+	for offset in range(days):
+		day = start + datetime.timedelta(days=offset)
+		for difficulty in engine.difficulties:
+			if cache.get(day, difficulty) is None:
+				entry = compute(day, difficulty)
+				if entry:
+					cache.put(entry)
+					cache.save()
+	cache.save()
+	return cache
+
+def start_background(path=CACHE_FILE, interval=3600, days=2):
+	# Runs the refresh in a separate process every `interval` seconds, so
+	# the solver doesn't compete with the server for the GIL
+	def loop():
+		while True:
+			subprocess.run([sys.executable, os.path.abspath(__file__), "--cache", path, "--days", str(days)], stdout=subprocess.DEVNULL)
+			time.sleep(interval)
+	thread = threading.Thread(target=loop, daemon=True)
+	thread.start()
+	return thread
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Pick and rate the daily challenge seeds.")
+	parser.add_argument("--cache", default=CACHE_FILE)
+	parser.add_argument("--days", type=int, default=2, help="days to prepare, starting today")
+	args = parser.parse_args(argv)
+
+	sys.setrecursionlimit(10000)
+	start = time.perf_counter()
+	cache = refresh(args.cache, args.days)
+	for key, entry in sorted(cache.entries.items()):
+		print(key, entry["seed"], f"win {entry['win_probability']:.0%}", f"rooms {entry['expected_rooms']}")
+	print(f"Done in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,633 @@
+import os
+import random
+import struct
+
+"""
+###########
+### DECK ###
+###########
+"""
+card_values = {
+	"2": 2, "3": 3, "4": 4, "5": 5, "6": 6, "7": 7,
+	"8": 8, "9": 9, "10": 10, "J": 11, "Q": 12, "K": 13, "A": 14
+}
+
+values_to_cards =  {
+	2: "2", 3: "3", 4: "4", 5: "5", 6: "6", 7: "7",
+	8: "8", 9: "9", 10: "10", 11: "J", 12: "Q", 13: "K", 14: "A"
+}
+
+card_names = list(card_values.keys())
+suits = ["spades", "diamonds", "hearts", "clubs"]
+difficulties = ["easy", "normal"]
+
+class Card:
+	def __init__(self, rank, suit):
+		self.rank = rank
+		self.suit = suit
+
+	def strength(self):
+		return card_values[self.rank]
+
+	def full(self):
+		return f"{self.rank} of {self.suit}"
+
+	def get_suit(self):
+		return self.suit
+
+deck = {}
+deck_names = []
+
+for s in suits:
+	for r in card_names:
+		name = f"{r}_of_{s}"
+		deck[name] = Card(r, s)
+		deck_names.append(name)
+
+# Cards are ints 0 - 51 in deck_names order, so the tables below replace
+# the dict and string lookups in the hot paths
+SPADES, DIAMONDS, HEARTS, CLUBS = range(4)
+
+card_ids = {name: i for i, name in enumerate(deck_names)}
+card_strength = [deck[name].strength() for name in deck_names]
+card_suit = [suits.index(deck[name].suit) for name in deck_names]
+card_is_monster = [s == SPADES or s == CLUBS for s in card_suit]
+
+# Clubs and spades of the same rank play identically, so both map to the
+# spade. The room's order doesn't change the legal actions either, which is
+# why state keys treat the deck and room as multisets of canonical cards.
+canonical_card = [c - 3 * len(card_names) if card_suit[c] == CLUBS else c for c in range(len(deck_names))]
+canonical_bytes = bytes(canonical_card) + bytes(range(len(deck_names), 256))  # for bytes.translate
+
+def card_name(card):
+	return deck_names[card]
+
+def cards_mask(cards):
+	mask = 0
+	for c in cards:
+		mask |= 1 << c
+	return mask
+
+# Normal mode plays without the high (J - A) diamonds and hearts
+difficulty_decks = {
+	"easy": list(range(len(deck_names))),
+	"normal": [c for c in range(len(deck_names)) if card_is_monster[c] or card_strength[c] < 11]
+}
+
+def difficulty_deck(difficulty):
+	return difficulty_decks[difficulty].copy()
+
+"""
+###########
+### SEEDS ###
+###########
+"""
+
+# Batches of games take their seeds from a splitmix64 stream over one master
+# seed. Seed i can be computed on its own, so workers never need to coordinate.
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+def new_seed():
+	return random.randrange(os.sys.maxsize)
+
+def splitmix64(x):
+	x = (x + GOLDEN_GAMMA) & MASK64
+	x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+	x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+	return x ^ (x >> 31)
+
+def derive_seed(master, index):
+	# Kept below sys.maxsize so derived seeds can be typed at the seed prompt
+	return splitmix64((master + index * GOLDEN_GAMMA) & MASK64) & os.sys.maxsize
+
+def seed_stream(master, count, start=0):
+	for i in range(start, start + count):
+		yield derive_seed(master, i)
+
+"""
+################
+### STATE KEYS ###
+################
+"""
+
+# Zobrist keys: one random 64-bit key per canonical card and place, summed
+# (not xored, which would cancel a pair like 5 of spades + 5 of clubs) into
+# the room's hashes as cards move. The scalar part of the state is mixed in
+# with one splitmix64 call, so a key never needs the cards walked again.
+_zobrist = random.Random(0x5C0D7E1)
+deck_keys = [_zobrist.getrandbits(64) for _ in deck_names]
+room_keys = [_zobrist.getrandbits(64) for _ in deck_names]
+deck_keys = [deck_keys[canonical_card[c]] for c in range(len(deck_names))]
+room_keys = [room_keys[canonical_card[c]] for c in range(len(deck_names))]
+
+# Masks fold the same way: a rank held once (either suit) sets the spade
+# bit, a rank held in both suits sets the club bit
+RANKS_MASK = (1 << len(card_names)) - 1
+CLUBS_SHIFT = 3 * len(card_names)
+MONSTER_BITS = RANKS_MASK | RANKS_MASK << CLUBS_SHIFT
+
+def canonical_mask(mask):
+	spades = mask & RANKS_MASK
+	clubs = mask >> CLUBS_SHIFT & RANKS_MASK
+	return mask & ~MONSTER_BITS | (spades ^ clubs) | (spades & clubs) << CLUBS_SHIFT
+
+def cards_hash(cards, keys):
+	return sum(keys[c] for c in cards) & MASK64
+
+def state_hash(deck_hash, room_hash, hp, weapon, last, heal_used, skipped_last, played_first, endless=False):
+	scalars = (
+		(hp & 0xFF) << 16 | weapon << 12 | last << 8
+		| heal_used << 3 | skipped_last << 2 | played_first << 1 | endless
+	)
+	return (deck_hash + room_hash + splitmix64(scalars)) & MASK64
+
+"""
+################
+### ROOM LOGIC ###
+################
+"""
+
+class Room:
+	def __init__(self, deck: list, rng=None):
+		self.rng = rng if rng is not None else random.Random()
+		self.original_deck = deck.copy()  # Never modified - used for endless mode
+		self.deck = deck.copy()  # Cards not yet dealt
+		self.deck_mask = cards_mask(deck)  # Bit c is set while card c is in self.deck
+		self.deck_hash = cards_hash(deck, deck_keys)
+		self.room_hash = 0
+		self.shared = False  # deck and card_seq are also held by a snapshot
+
+		self.heal_used = False
+		self.skipped_last = False
+		self.played_first_card = False
+
+		# Deal initial 4 cards
+		self.card_seq = []
+		self.add_cards(4)
+
+	def own(self):
+		# Copy-on-write: lists a snapshot still holds are copied before the
+		# first change, so taking a snapshot never copies anything
+		if self.shared:
+			self.deck = self.deck.copy()
+			self.card_seq = self.card_seq.copy()
+			self.shared = False
+
+	def draw(self, amount):
+		# Sampling indices from range(len(deck)) consumes the RNG exactly like
+		# random.sample(deck) did, so seeds keep dealing the same cards
+		self.own()
+		deck = self.deck
+		picks = self.rng.sample(range(len(deck)), k=amount)
+		cards = [deck[i] for i in picks]
+		for i in sorted(picks, reverse=True):
+			self.deck_mask ^= 1 << deck[i]
+			self.deck_hash -= deck_keys[deck[i]]
+			del deck[i]
+		self.deck_hash &= MASK64
+		return cards
+
+	def choose_card(self, card):
+		self.own()
+		card = self.card_seq.pop(card-1)
+		self.room_hash = (self.room_hash - room_keys[card]) & MASK64
+		return card
+
+	def add_cards(self, amount):
+		amount = min(amount, len(self.deck))
+		if amount > 0:
+			self.own()
+			cards = self.draw(amount)
+			self.card_seq.extend(cards)
+			self.room_hash = (self.room_hash + cards_hash(cards, room_keys)) & MASK64
+
+	def reset(self, amount):
+		# Return current cards to deck
+		self.own()
+		self.deck.extend(self.card_seq)
+		self.deck_mask |= cards_mask(self.card_seq)
+		self.deck_hash = (self.deck_hash + cards_hash(self.card_seq, deck_keys)) & MASK64
+		self.card_seq = []
+		self.room_hash = 0
+		# Deal new cards
+		self.add_cards(min(amount, len(self.deck)))
+
+	def replenish_deck(self):
+		# Restore full deck and deal new cards
+		self.deck = self.original_deck.copy()
+		self.deck_mask = cards_mask(self.deck)
+		self.deck_hash = cards_hash(self.deck, deck_keys)
+		self.card_seq = []
+		self.room_hash = 0
+		self.shared = False
+		self.add_cards(4)
+
+
+class Player:
+	def __init__(self, max_hp):
+		self.max_hp = max_hp
+		self.hp = max_hp
+		self.current_weapon = 0
+		self.last_card_killed = 0
+
+	def take_damage(self, amount):
+		self.hp -= amount
+
+	def get_HP(self):
+		return self.hp
+
+	def heal(self, amount):
+		if amount + self.hp > self.max_hp:
+			self.hp = self.max_hp
+		else:
+			self.hp += amount
+
+"""
+###############
+#### ACTIONS ####
+###############
+"""
+
+# Actions are small ints so they can be stored and compared cheaply:
+# 0 skips the room, 1 - 8 pick one of the (up to 4) room cards with or
+# without using the weapon / equipping the diamond, 9 continues into
+# endless mode after a win. 10 and 11 only appear in a game's action log,
+# where they record the can_die / infinite_skips cheats being toggled, and
+# so does 12, which marks an undo.
+SKIP = 0
+ENDLESS = 9
+TOGGLE_CAN_DIE = 10
+TOGGLE_INFINITE_SKIPS = 11
+UNDO = 12
+MAX_ROOM_CARDS = 4
+
+def pick(index, use=True):
+	# index is 0-based into room.card_seq
+	return 1 + index * 2 + (0 if use else 1)
+
+def decode(action):
+	return (action - 1) // 2, (action - 1) % 2 == 0
+
+"""
+##############
+#### GAME ####
+##############
+"""
+
+class Game:
+	def __init__(self, seed=None, difficulty="easy", max_hp=20):
+		if difficulty not in difficulties:
+			raise ValueError(f"Unknown difficulty: {difficulty}")
+		if seed is None:
+			seed = new_seed()
+
+		self.seed = seed
+		self.difficulty = difficulty
+		self.rng = random.Random(seed)
+
+		self.player = Player(max_hp)
+		self.room = Room(difficulty_deck(difficulty), self.rng)
+		self.current_room = 1
+		self.status = "playing"
+		self.endless_mode = False
+		self.actions = bytearray()  # Every action taken, so the run can be replayed
+
+		# Cheats
+		self._can_die = True
+		self._infinite_skips = False
+
+		# Run info
+		self.highest_weapon = 0
+		self.highest_card_killed = 0
+		self.highest_damage = 0
+		self.highest_heal = 0
+
+	@property
+	def over(self):
+		return self.status != "playing"
+
+	@property
+	def can_die(self):
+		return self._can_die
+
+	@can_die.setter
+	def can_die(self, value):
+		if value != self._can_die:
+			self.actions.append(TOGGLE_CAN_DIE)
+		self._can_die = value
+
+	@property
+	def infinite_skips(self):
+		return self._infinite_skips
+
+	@infinite_skips.setter
+	def infinite_skips(self, value):
+		if value != self._infinite_skips:
+			self.actions.append(TOGGLE_INFINITE_SKIPS)
+		self._infinite_skips = value
+
+	def snapshot(self):
+		# O(1) apart from the RNG state: the deck lists are shared with the
+		# game until it next changes them (see Room.own), and the action log
+		# is shared up to its length now
+		room = self.room
+		player = self.player
+		room.shared = True
+		return Snapshot(
+			self.seed, self.difficulty, self.rng.getstate(),
+			(player.max_hp, player.hp, player.current_weapon, player.last_card_killed),
+			(room.original_deck, room.deck, room.card_seq, room.deck_mask,
+			room.deck_hash, room.room_hash, room.heal_used, room.skipped_last,
+			room.played_first_card),
+			(self.current_room, self.status, self.endless_mode, self._can_die,
+			self._infinite_skips, self.highest_weapon, self.highest_card_killed,
+			self.highest_damage, self.highest_heal, self.actions),
+			len(self.actions)
+		)
+
+	def restore(self, snapshot):
+		# Undo: back to the snapshot, in place so references to game.player
+		# and game.room stay valid. The log is rewound too but keeps an UNDO,
+		# so a run that peeked at deals and took moves back still shows it.
+		self.load(snapshot)
+		self.actions.append(UNDO)
+
+	def load(self, snapshot):
+		room = self.room
+		player = self.player
+		self.seed = snapshot.seed
+		self.difficulty = snapshot.difficulty
+		self.rng.setstate(snapshot.rng_state)
+		player.max_hp, player.hp, player.current_weapon, player.last_card_killed = snapshot.player
+		(room.original_deck, room.deck, room.card_seq, room.deck_mask,
+		room.deck_hash, room.room_hash, room.heal_used, room.skipped_last,
+		room.played_first_card) = snapshot.room
+		room.shared = True
+		(self.current_room, self.status, self.endless_mode, self._can_die,
+		self._infinite_skips, self.highest_weapon, self.highest_card_killed,
+		self.highest_damage, self.highest_heal, actions) = snapshot.game
+		if actions is self.actions:
+			# This game's own log: cut back to the snapshot, no copy
+			del actions[snapshot.log_length:]
+		else:
+			self.actions = bytearray(actions[:snapshot.log_length])
+
+	@classmethod
+	def from_snapshot(cls, snapshot):
+		game = cls.__new__(cls)
+		game.rng = random.Random()
+		game.player = Player(snapshot.player[0])
+		game.room = Room.__new__(Room)
+		game.room.rng = game.rng
+		game.actions = None
+		game.load(snapshot)
+		return game
+
+	@property
+	def state_hash(self):
+		# Same for any two games that only differ by clubs <-> spades of equal
+		# rank or by the order of the room's cards
+		room = self.room
+		player = self.player
+		return state_hash(
+			room.deck_hash, room.room_hash, player.hp, player.current_weapon,
+			player.last_card_killed, room.heal_used, room.skipped_last,
+			room.played_first_card, self.endless_mode
+		)
+
+	def canonical_state(self):
+		# Exact form of what state_hash summarises, for when a collision matters
+		room = self.room
+		player = self.player
+		return (
+			bytes(sorted(bytes(room.deck).translate(canonical_bytes))),
+			bytes(sorted(canonical_card[c] for c in room.card_seq)),
+			player.hp, player.current_weapon, player.last_card_killed,
+			room.heal_used, room.skipped_last, room.played_first_card, self.endless_mode
+		)
+
+	def can_skip(self):
+		# With an empty deck a skip deals the same cards back, so it's not offered
+		if not self.room.deck:
+			return False
+		return self.infinite_skips or (not self.room.skipped_last and not self.room.played_first_card)
+
+	def weapon_usable(self, strength):
+		last = self.player.last_card_killed
+		return self.player.current_weapon > 0 and (last >= strength or last == 0)
+
+	def needs_choice(self, index):
+		# True when picking this card asks "use weapon?" or "equip or discard?"
+		card = self.room.card_seq[index]
+		if card_is_monster[card]:
+			return self.weapon_usable(card_strength[card])
+		if card_suit[card] == DIAMONDS:
+			return self.player.current_weapon > 0
+		return False
+
+	def legal_actions(self):
+		if self.status == "won":
+			return [ENDLESS]
+		if self.over:
+			return []
+		actions = [SKIP] if self.can_skip() else []
+		for i in range(len(self.room.card_seq)):
+			actions.append(1 + i * 2)
+			if self.needs_choice(i):
+				actions.append(2 + i * 2)
+		return actions
+
+	def step(self, action):
+		if action == ENDLESS:
+			if self.status != "won":
+				raise ValueError("Endless mode is only available after a win")
+			self.room.replenish_deck()
+			self.endless_mode = True
+			self.status = "playing"
+			self.actions.append(ENDLESS)
+			return [("endless",)]
+
+		if self.over:
+			raise ValueError("The game is over")
+
+		events = []
+		if action == SKIP:
+			if not self.can_skip():
+				raise ValueError("You can't skip this room")
+			self.room.reset(4)
+			self.room.skipped_last = not self.infinite_skips
+			events.append(("skip",))
+		else:
+			index, use = decode(action)
+			if not 0 <= index < len(self.room.card_seq):
+				raise ValueError(f"No card at position {index + 1}")
+			self.room.played_first_card = True
+			self._resolve(self.room.card_seq[index], use, events)
+			self.room.choose_card(index + 1)
+
+		self.actions.append(action)
+		self._advance(events)
+		return events
+
+	def _resolve(self, card, use, events):
+		player = self.player
+		strength = card_strength[card]
+		suit = card_suit[card]
+
+		# Heal
+		if suit == HEARTS:
+			if strength > self.highest_heal:
+				self.highest_heal = strength
+
+			if not self.room.heal_used:
+				player.heal(strength)
+				self.room.heal_used = True
+				events.append(("heal", strength))
+			else:
+				events.append(("heal_discarded", strength))
+
+		# Deal damage
+		elif suit == SPADES or suit == CLUBS:
+			if strength > self.highest_card_killed:
+				self.highest_card_killed = strength
+
+			if use and self.weapon_usable(strength):
+				damage = max(0, strength - player.current_weapon)
+				player.last_card_killed = strength
+			else:
+				damage = strength
+
+			if self.highest_damage < damage:
+				self.highest_damage = damage
+
+			player.take_damage(damage)
+			events.append(("damage", damage))
+
+		# Get weapon/discard a weapon
+		elif suit == DIAMONDS:
+			if player.current_weapon > 0 and not use:
+				events.append(("weapon_discarded", strength))
+			else:
+				if player.current_weapon > 0:
+					player.last_card_killed = 0
+				player.current_weapon = strength
+				events.append(("weapon", strength))
+
+			if self.highest_weapon < strength:
+				self.highest_weapon = strength
+
+	def _advance(self, events):
+		room = self.room
+
+		# Replenish cards when only 1 left
+		if len(room.card_seq) < 2:
+			if len(room.deck) > 0:
+				room.add_cards(min(3, len(room.deck)))
+			elif self.endless_mode:
+				# Deck is empty in endless mode - replenish!
+				room.replenish_deck()
+
+			events.append(("room", self.current_room))
+			self.current_room += 1
+			room.skipped_last = False
+			room.heal_used = False
+			room.played_first_card = False
+
+		# A run that dies on its last card is lost, not won
+		if self.player.hp <= 0 and self.can_die:
+			self.status = "lost"
+			events.append(("lose",))
+
+		# Win condition - deck empty AND card_seq empty
+		elif len(room.deck) == 0 and len(room.card_seq) < 1 and not self.endless_mode:
+			self.status = "won"
+			events.append(("win",))
+
+"""
+#################
+### SNAPSHOTS ###
+#################
+"""
+
+class Snapshot:
+	# A frozen game state. The lists inside are shared with the game (and
+	# other snapshots) and must not be modified. So is the game's action
+	# log, of which the snapshot is the first log_length actions: restoring
+	# an earlier snapshot and playing on rewrites them, so only the snapshots
+	# taken before the one restored stay good, as with a stack of undos.
+	__slots__ = ("seed", "difficulty", "rng_state", "player", "room", "game", "log_length")
+
+	def __init__(self, seed, difficulty, rng_state, player, room, game, log_length):
+		self.seed = seed
+		self.difficulty = difficulty
+		self.rng_state = rng_state
+		self.player = player
+		self.room = room
+		self.game = game
+		self.log_length = log_length
+
+	def to_bytes(self):
+		# Fixed fields, then the card lists, the action log and the Mersenne
+		# Twister state, which is most of the size (2.5 KB)
+		max_hp, hp, weapon, last = self.player
+		original_deck, deck, card_seq, _, _, _, heal_used, skipped_last, played_first = self.room
+		(current_room, status, endless_mode, can_die, infinite_skips, highest_weapon,
+		highest_card_killed, highest_damage, highest_heal, actions) = self.game
+		actions = bytes(actions[:self.log_length])
+		version, state, gauss_next = self.rng_state
+		flags = (
+			heal_used | skipped_last << 1 | played_first << 2 | endless_mode << 3
+			| can_die << 4 | infinite_skips << 5 | (gauss_next is not None) << 6
+		)
+		seed = self.seed.to_bytes(self.seed.bit_length() // 8 + 1, "little", signed=True)
+		return b"".join([
+			SNAPSHOT_HEADER.pack(
+				SNAPSHOT_VERSION, difficulties.index(self.difficulty), statuses.index(status),
+				flags, max_hp, hp, weapon, last, current_room, highest_weapon,
+				highest_card_killed, highest_damage, highest_heal, len(seed),
+				len(original_deck), len(deck), len(card_seq), len(actions)
+			),
+			seed, bytes(original_deck), bytes(deck), bytes(card_seq), actions,
+			RNG_STATE.pack(*state), struct.pack("<d", gauss_next or 0.0)
+		])
+
+	@classmethod
+	def from_bytes(cls, data):
+		(snapshot_version, difficulty, status, flags, max_hp, hp, weapon, last,
+		current_room, highest_weapon, highest_card_killed, highest_damage,
+		highest_heal, seed_len, original_len, deck_len, room_len, actions_len) = SNAPSHOT_HEADER.unpack_from(data)
+		if snapshot_version != SNAPSHOT_VERSION:
+			raise ValueError(f"Unsupported snapshot version: {snapshot_version}")
+		at = SNAPSHOT_HEADER.size
+		seed = int.from_bytes(data[at:at + seed_len], "little", signed=True)
+		at += seed_len
+		original_deck = list(data[at:at + original_len])
+		at += original_len
+		deck = list(data[at:at + deck_len])
+		at += deck_len
+		card_seq = list(data[at:at + room_len])
+		at += room_len
+		actions = bytes(data[at:at + actions_len])
+		at += actions_len
+		state = RNG_STATE.unpack_from(data, at)
+		gauss_next = struct.unpack_from("<d", data, at + RNG_STATE.size)[0] if flags >> 6 & 1 else None
+		return cls(
+			seed, difficulties[difficulty], (3, state, gauss_next),
+			(max_hp, hp, weapon, last),
+			(original_deck, deck, card_seq, cards_mask(deck), cards_hash(deck, deck_keys),
+			cards_hash(card_seq, room_keys), bool(flags & 1), bool(flags >> 1 & 1),
+			bool(flags >> 2 & 1)),
+			(current_room, statuses[status], bool(flags >> 3 & 1), bool(flags >> 4 & 1),
+			bool(flags >> 5 & 1), highest_weapon, highest_card_killed, highest_damage,
+			highest_heal, actions),
+			len(actions)
+		)
+
+statuses = ["playing", "won", "lost"]
+SNAPSHOT_VERSION = 2
+# version, difficulty, status, flags, max_hp, hp, weapon, last, current_room,
+# the four highest_* stats, then the lengths of the seed, the card lists and
+# the action log
+SNAPSHOT_HEADER = struct.Struct("<BBBBhhBBIBBBBBBBBI")
+RNG_STATE = struct.Struct("<625I")
@@ -0,0 +1,182 @@
+import argparse
+import time
+import numpy as np
+import engine
+import batch_sim
+from batch_sim import NCARDS, NACTIONS, STRENGTH, SUIT, MONSTER
+
+# Training environments with a Gym-style API, without depending on gym:
+#
+#   obs, info = env.reset(seed)
+#   obs, reward, terminated, truncated, info = env.step(action)
+#
+# Actions are the engine's 0 - 8 (skip and the picks, see engine.py) and
+# info["mask"] marks the legal ones. The reward is +1 for a win and -1 for
+# a loss, 0 otherwise. Env plays one engine.Game, so reset(seed) deals
+# exactly like the game does. VectorEnv steps N games at once on a
+# batch_sim.BatchGame, with array operations only, and starts a new game in
+# any row that finished (its deals come from NumPy's RNG, not engine seeds).
+#
+# Observations are OBS_SIZE float32s, all in [0, 1]:
+#
+#   4 room slots     present, strength / 14, monster, diamond, heart
+#   player           hp / max_hp, weapon / 14, last card killed / 14
+#   room flags       heal used, skipped last, played first card
+#   deck             monsters left per rank / 2, diamonds and hearts left
+#                    per rank, cards left / 52
+#
+# Needs numpy, like batch_sim.py.
+#
+# Usage: python env.py --envs 4096 --steps 200
+
+SLOT_FEATURES = 5
+OBS_SIZE = engine.MAX_ROOM_CARDS * SLOT_FEATURES + 6 + 3 * len(engine.card_names) + 1
+
+# Deck cards -> remaining count per (monster, diamond, heart) x rank
+_groups = np.zeros((NCARDS, 3 * len(engine.card_names)), dtype=np.float32)
+for c in range(NCARDS):
+	group = 0 if engine.card_is_monster[c] else 1 if engine.card_suit[c] == engine.DIAMONDS else 2
+	_groups[c, group * len(engine.card_names) + engine.card_strength[c] - 2] = 0.5 if group == 0 else 1.0
+
+def encode(room, hp, weapon, last, heal_used, skipped_last, played_first, deck, max_hp):
+	# Arrays with one row per game (room is card ids with -1 for empty slots,
+	# deck the (games, 52) cards still in the deck) -> (games, OBS_SIZE)
+	games = len(hp)
+	obs = np.empty((games, OBS_SIZE), dtype=np.float32)
+	slots = obs[:, :engine.MAX_ROOM_CARDS * SLOT_FEATURES].reshape(games, engine.MAX_ROOM_CARDS, SLOT_FEATURES)
+	suit = SUIT[room]
+	slots[:, :, 0] = room >= 0
+	slots[:, :, 1] = STRENGTH[room] / 14
+	slots[:, :, 2] = MONSTER[room]
+	slots[:, :, 3] = suit == engine.DIAMONDS
+	slots[:, :, 4] = suit == engine.HEARTS
+	at = engine.MAX_ROOM_CARDS * SLOT_FEATURES
+	obs[:, at] = np.maximum(hp, 0) / max_hp
+	obs[:, at + 1] = weapon / 14
+	obs[:, at + 2] = last / 14
+	obs[:, at + 3] = heal_used
+	obs[:, at + 4] = skipped_last
+	obs[:, at + 5] = played_first
+	obs[:, at + 6:-1] = deck @ _groups
+	obs[:, -1] = deck.sum(axis=1) / NCARDS
+	return obs
+
+def reward(status):
+	return (status == batch_sim.WON).astype(np.float32) - (status == batch_sim.LOST)
+
+class Env:
+	def __init__(self, difficulty="easy", max_hp=20):
+		self.difficulty = difficulty
+		self.max_hp = max_hp
+		self.game = None
+
+	def observe(self):
+		game = self.game
+		room = game.room
+		player = game.player
+		slots = np.full((1, engine.MAX_ROOM_CARDS), -1, dtype=np.int16)
+		slots[0, :len(room.card_seq)] = room.card_seq
+		deck = np.zeros((1, NCARDS), dtype=np.float32)
+		deck[0, room.deck] = 1
+		return encode(
+			slots, [player.hp], player.current_weapon, player.last_card_killed,
+			room.heal_used, room.skipped_last, room.played_first_card, deck, player.max_hp
+		)[0]
+
+	def mask(self):
+		mask = np.zeros(NACTIONS, dtype=bool)
+		if not self.game.over:
+			mask[self.game.legal_actions()] = True
+		return mask
+
+	def info(self):
+		return {"mask": self.mask(), "rooms": self.game.current_room - 1, "won": self.game.status == "won"}
+
+	def reset(self, seed=None):
+		self.game = engine.Game(seed, self.difficulty, self.max_hp)
+		return self.observe(), self.info()
+
+	def step(self, action):
+		# Raises ValueError for an action info["mask"] rules out, like VectorEnv.step
+		game = self.game
+		action = int(action)
+		if not 0 <= action < NACTIONS or not self.mask()[action]:
+			raise ValueError("Illegal action")
+		game.step(action)
+		status = batch_sim.WON if game.status == "won" else batch_sim.LOST if game.status == "lost" else batch_sim.PLAYING
+		return self.observe(), float(reward(np.array(status))), game.over, False, self.info()
+
+class VectorEnv:
+	def __init__(self, envs, difficulty="easy", max_hp=20):
+		self.envs = envs
+		self.difficulty = difficulty
+		self.max_hp = max_hp
+		self.batch = None
+
+	def observe(self):
+		b = self.batch
+		return encode(
+			b.room, b.hp, b.current_weapon, b.last_card_killed, b.heal_used,
+			b.skipped_last, b.played_first_card, b.deck.astype(np.float32), b.max_hp
+		)
+
+	def reset(self, seed=None):
+		self.batch = batch_sim.BatchGame(self.envs, self.difficulty, seed, self.max_hp)
+		return self.observe(), {"mask": self.batch.legal_mask()}
+
+	def step(self, actions):
+		# One action per env. Finished rows restart at once: their obs is the
+		# new game's, and info["won"] and info["rooms"] describe the game that
+		# just ended (rooms is 0 for rows still playing).
+		b = self.batch
+		actions = np.asarray(actions)
+		if not b.legal_mask()[np.arange(self.envs), actions].all():
+			raise ValueError("Illegal action")
+		b.step(actions)
+		done = ~b.active
+		rewards = reward(b.status)
+		won = b.status == batch_sim.WON
+		rooms = np.where(done, b.current_room - 1, 0)
+		b.reset(np.flatnonzero(done))
+		info = {"mask": b.legal_mask(), "won": won, "rooms": rooms}
+		return self.observe(), rewards, done, np.zeros(self.envs, dtype=bool), info
+
+def random_legal(mask, rng):
+	# One uniformly random legal action per row
+	keys = rng.random(mask.shape)
+	keys[~mask] = -1.0
+	return keys.argmax(axis=1)
+
+def bench(envs, steps, difficulty):
+	rng = np.random.default_rng(0)
+	env = Env(difficulty)
+	obs, info = env.reset(0)
+	start = time.perf_counter()
+	for i in range(steps * 10):
+		obs, r, done, _, info = env.step(rng.choice(np.flatnonzero(info["mask"])))
+		if done:
+			obs, info = env.reset(i)
+	scalar = steps * 10 / (time.perf_counter() - start)
+	print(f"Env:       {scalar:10.0f} steps/s")
+
+	vec = VectorEnv(envs, difficulty)
+	obs, info = vec.reset(0)
+	episodes = wins = 0
+	start = time.perf_counter()
+	for _ in range(steps):
+		obs, r, done, _, info = vec.step(random_legal(info["mask"], rng))
+		episodes += done.sum()
+		wins += info["won"].sum()
+	vector = envs * steps / (time.perf_counter() - start)
+	print(f"VectorEnv: {vector:10.0f} steps/s ({envs} envs, {vector / scalar:.0f}x), {episodes} episodes, {wins} won")
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Measure the training environments' step rate with random legal actions.")
+	parser.add_argument("--envs", type=int, default=4096)
+	parser.add_argument("--steps", type=int, default=200, help="vector steps (the scalar env takes 10x as many)")
+	parser.add_argument("--difficulty", choices=engine.difficulties, default="easy")
+	args = parser.parse_args(argv)
+	bench(args.envs, args.steps, args.difficulty)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,346 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import secrets
+import struct
+import subprocess
+import sys
+import time
+import engine
+
+# Hosts Scoundrel sessions on the headless engine, each with its own game
+# and RNG. Clients talk in lines over TCP, or in text frames over a
+# WebSocket on the same port (anything starting with "GET " is treated as
+# a WebSocket handshake):
+#
+#   new [difficulty] [seed]   start a session
+#   resume <session>          re-attach to a session after reconnecting
+#   act <action>              play an engine action (an int, see engine.py)
+#   stats                     server counters
+#   quit
+#
+# Every reply is one JSON object: a frame with the session's state, the
+# legal actions and the events of the last action, or {"error": ...}.
+# A connection handles one command at a time and waits for its reply to
+# drain, so a slow reader only slows itself down. Sessions outlive their
+# connection until they've been idle for --idle seconds; a finished game, or
+# one the connection replaced with `new`, is dropped right away.
+#
+# Usage: python game_server.py serve --port 8765
+#        python game_server.py load --spawn --sessions 1000
+
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC11B65"
+MAX_LINE = 1024
+
+class Session:
+	def __init__(self, id, game):
+		self.id = id
+		self.game = game
+		self.attached = True
+		self.last_active = time.monotonic()
+
+	def frame(self, events=()):
+		game = self.game
+		player = game.player
+		return {
+			"session": self.id, "seed": game.seed, "difficulty": game.difficulty,
+			"room": game.room.card_seq, "hp": player.hp, "weapon": player.current_weapon,
+			"last": player.last_card_killed, "deck": len(game.room.deck),
+			"current_room": game.current_room, "status": game.status,
+			"actions": game.legal_actions(), "events": events
+		}
+
+class GameServer:
+	def __init__(self, max_sessions=10000, idle=300):
+		self.sessions = {}
+		self.max_sessions = max_sessions
+		self.idle = idle
+		self.connections = 0
+		self.actions = 0
+		self.evicted = 0
+
+	def handle(self, line, session):
+		# Runs one command; returns (reply, session now attached to the connection)
+		parts = line.split()
+		if not parts:
+			return {"error": "empty command"}, session
+		command, args = parts[0], parts[1:]
+
+		if command == "act":
+			if session is None:
+				return {"error": "no session"}, session
+			try:
+				events = session.game.step(int(args[0]))
+			except (ValueError, IndexError) as e:
+				return {"error": str(e) or "bad action"}, session
+			self.actions += 1
+			session.last_active = time.monotonic()
+			return session.frame(events), session
+
+		if command == "new":
+			if len(self.sessions) >= self.max_sessions:
+				return {"error": "server full"}, session
+			difficulty = args[0] if args else "easy"
+			if difficulty not in engine.difficulties:
+				return {"error": f"unknown difficulty: {difficulty}"}, session
+			seed = int(args[1]) if len(args) > 1 and args[1].isnumeric() else None
+			self.drop(session)
+			session = Session(secrets.token_hex(8), engine.Game(seed, difficulty))
+			self.sessions[session.id] = session
+			return session.frame(), session
+
+		if command == "resume":
+			found = self.sessions.get(args[0]) if args else None
+			if found is None or found.attached:
+				return {"error": "no such session"}, session
+			self.detach(session)
+			found.attached = True
+			found.last_active = time.monotonic()
+			return found.frame(), found
+
+		if command == "stats":
+			return {
+				"sessions": len(self.sessions), "connections": self.connections,
+				"actions": self.actions, "evicted": self.evicted,
+				"cpu": time.process_time()
+			}, session
+
+		return {"error": f"unknown command: {command}"}, session
+
+	def detach(self, session):
+		if session is not None:
+			if session.game.over:
+				self.drop(session)
+				return
+			session.attached = False
+			session.last_active = time.monotonic()
+
+	def drop(self, session):
+		if session is not None:
+			self.sessions.pop(session.id, None)
+
+	async def evict_idle(self):
+		while True:
+			await asyncio.sleep(max(1, self.idle / 4))
+			cutoff = time.monotonic() - self.idle
+			for id in [id for id, s in self.sessions.items() if s.last_active < cutoff]:
+				del self.sessions[id]
+				self.evicted += 1
+
+	async def serve_client(self, reader, writer):
+		writer.transport.set_write_buffer_limits(high=64 * 1024)
+		self.connections += 1
+		session = None
+		try:
+			first = await asyncio.wait_for(reader.readline(), self.idle)
+			if first.startswith(b"GET "):
+				conn = await WebSocket.accept(reader, writer)
+				first = None
+			else:
+				conn = LineConnection(reader, writer)
+
+			while True:
+				if first is not None:
+					line, first = first, None
+				else:
+					line = await asyncio.wait_for(conn.read(), self.idle)
+				if line is None:
+					break
+				line = line.decode(errors="replace").strip()
+				if line == "quit":
+					break
+				reply, session = self.handle(line, session)
+				await conn.write(json.dumps(reply, separators=(",", ":")).encode())
+		except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+			pass
+		finally:
+			self.connections -= 1
+			self.detach(session)
+			writer.close()
+
+	async def serve(self, host, port):
+		server = await asyncio.start_server(self.serve_client, host, port, limit=MAX_LINE, backlog=1024)
+		asyncio.ensure_future(self.evict_idle())
+		print(f"Serving games on {host}:{port}", flush=True)
+		async with server:
+			await server.serve_forever()
+
+class LineConnection:
+	def __init__(self, reader, writer):
+		self.reader = reader
+		self.writer = writer
+
+	async def read(self):
+		line = await self.reader.readline()
+		return line or None
+
+	async def write(self, data):
+		self.writer.write(data + b"\n")
+		await self.writer.drain()
+
+class WebSocket:
+	# Just enough RFC 6455 for short text messages: no extensions, and
+	# fragmented messages are refused
+	def __init__(self, reader, writer):
+		self.reader = reader
+		self.writer = writer
+
+	@classmethod
+	async def accept(cls, reader, writer):
+		headers = {}
+		while True:
+			line = await reader.readline()
+			if line in (b"\r\n", b"\n", b""):
+				break
+			name, _, value = line.decode().partition(":")
+			headers[name.strip().lower()] = value.strip()
+		key = headers.get("sec-websocket-key")
+		if key is None:
+			writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+			raise ValueError("not a WebSocket request")
+		accept = base64.b64encode(hashlib.sha1(key.encode() + WS_GUID).digest())
+		writer.write(
+			b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+			b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+		)
+		await writer.drain()
+		return cls(reader, writer)
+
+	async def read(self):
+		while True:
+			head = await self.reader.readexactly(2)
+			fin, opcode = head[0] & 0x80, head[0] & 0x0F
+			size = head[1] & 0x7F
+			if size == 126:
+				size = struct.unpack("!H", await self.reader.readexactly(2))[0]
+			elif size == 127:
+				size = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+			if size > MAX_LINE or not fin:
+				raise ValueError("message too large")
+			mask = await self.reader.readexactly(4) if head[1] & 0x80 else b"\0\0\0\0"
+			payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await self.reader.readexactly(size)))
+			if opcode == 0x8:
+				return None
+			if opcode == 0x9:
+				await self.send(0xA, payload)
+			elif opcode == 0x1:
+				return payload
+
+	async def send(self, opcode, data):
+		size = len(data)
+		if size < 126:
+			head = struct.pack("!BB", 0x80 | opcode, size)
+		elif size < 1 << 16:
+			head = struct.pack("!BBH", 0x80 | opcode, 126, size)
+		else:
+			head = struct.pack("!BBQ", 0x80 | opcode, 127, size)
+		self.writer.write(head + data)
+		await self.writer.drain()
+
+	async def write(self, data):
+		await self.send(0x1, data)
+
+"""
+#################
+### LOAD TEST ###
+#################
+"""
+
+async def client_session(host, port, difficulty, deadline, latencies, rng):
+	# Plays random legal actions until the deadline, starting a new game
+	# whenever one ends. Any error reply fails the client.
+	reader, writer = await asyncio.open_connection(host, port, limit=1 << 16)
+	async def call(line):
+		start = time.perf_counter()
+		writer.write(line.encode() + b"\n")
+		await writer.drain()
+		reply = json.loads(await reader.readline())
+		if "error" in reply:
+			raise RuntimeError(f"{line!r}: {reply['error']}")
+		return reply, time.perf_counter() - start
+
+	frame, _ = await call(f"new {difficulty}")
+	while time.monotonic() < deadline:
+		if frame.get("status") != "playing":
+			frame, _ = await call(f"new {difficulty}")
+			continue
+		frame, latency = await call(f"act {rng.choice(frame['actions'])}")
+		latencies.append(latency)
+	writer.write(b"quit\n")
+	await writer.drain()
+	writer.close()
+
+async def load_test(host, port, sessions, seconds, difficulty, ramp):
+	async def stats():
+		reader, writer = await asyncio.open_connection(host, port)
+		writer.write(b"stats\nquit\n")
+		reply = json.loads(await reader.readline())
+		writer.close()
+		return reply
+
+	rng = random.Random(0)
+	latencies = []
+	before = await stats()
+	start = time.monotonic()
+	deadline = start + seconds
+	tasks = []
+	for i in range(sessions):
+		tasks.append(asyncio.ensure_future(client_session(host, port, difficulty, deadline, latencies, random.Random(rng.random()))))
+		if ramp:
+			await asyncio.sleep(ramp / sessions)
+	results = await asyncio.gather(*tasks, return_exceptions=True)
+	wall = time.monotonic() - start
+	after = await stats()
+
+	errors = [r for r in results if isinstance(r, Exception)]
+	latencies.sort()
+	def pct(p):
+		return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else float("nan")
+	cores = (after["cpu"] - before["cpu"]) / wall
+	print(f"{sessions} sessions for {wall:.1f}s, {len(errors)} failed" + (f" ({errors[0]!r})" if errors else ""))
+	print(f"{len(latencies)} actions, {len(latencies) / wall:.0f} actions/s")
+	print(f"latency p50 {pct(0.5):.2f} ms, p99 {pct(0.99):.2f} ms, max {pct(1):.2f} ms")
+	print(f"server used {cores:.2f} cores: {sessions / max(cores, 1e-9):.0f} sessions/core, {len(latencies) / wall / max(cores, 1e-9):.0f} actions/s/core")
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Host Scoundrel sessions over TCP/WebSocket, or load test a host.")
+	sub = parser.add_subparsers(dest="command", required=True)
+	serve = sub.add_parser("serve")
+	serve.add_argument("--host", default="localhost")
+	serve.add_argument("--port", type=int, default=8765)
+	serve.add_argument("--max-sessions", type=int, default=10000)
+	serve.add_argument("--idle", type=float, default=300, help="seconds before an idle session is evicted")
+	load = sub.add_parser("load")
+	load.add_argument("--host", default="localhost")
+	load.add_argument("--port", type=int, default=8765)
+	load.add_argument("--sessions", type=int, default=1000)
+	load.add_argument("--seconds", type=float, default=10)
+	load.add_argument("--ramp", type=float, default=1, help="seconds over which sessions connect")
+	load.add_argument("--difficulty", choices=engine.difficulties, default="easy")
+	load.add_argument("--spawn", action="store_true", help="start a local server for the test")
+	args = parser.parse_args(argv)
+
+	if args.command == "serve":
+		asyncio.run(GameServer(args.max_sessions, args.idle).serve(args.host, args.port))
+		return
+
+	server = None
+	if args.spawn:
+		server = subprocess.Popen(
+			[sys.executable, os.path.abspath(__file__), "serve", "--host", args.host, "--port", str(args.port), "--max-sessions", str(args.sessions * 2)],
+			stdout=subprocess.PIPE
+		)
+		server.stdout.readline()  # wait until it's listening
+	try:
+		asyncio.run(load_test(args.host, args.port, args.sessions, args.seconds, args.difficulty, args.ramp))
+	finally:
+		if server:
+			server.terminate()
+			server.wait()
+
+if __name__ == "__main__":
+	main()
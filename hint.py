@@ -0,0 +1,196 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import engine
+import bots
+import mcts
+
+# The in-game hint: the action a Monte Carlo tree search (see mcts.py) likes
+# best within a time budget, with its estimated chance to win (in endless
+# mode, to survive the next mcts.HORIZON rooms).
+#
+# Each worker process grows its own tree from its own deals and the hint
+# adds up their visit counts per action. A worker keeps its tree between
+# hints: when the game has moved on, it walks down the moves played since
+# and searches on from there, so consecutive hints build on each other. In
+# the browser there are no processes and the search runs in the game's own.
+#
+# With an endgame tablebase for the difficulty next to the game (see
+# tablebase.py), the hint plays its known win once the deck is empty, and
+# the searches' rollouts use it too.
+#
+# Usage: python hint.py --rooms 300 --hints 10
+
+# Log entries that aren't moves
+MARKERS = {engine.TOGGLE_CAN_DIE, engine.TOGGLE_INFINITE_SKIPS, engine.UNDO}
+
+TABLEBASE = "endgame-{}.tb"
+
+def endgame(difficulty):
+	# The difficulty's tablebase, or None if its file isn't there
+	path = TABLEBASE.format(difficulty)
+	if not os.path.exists(path):
+		return None
+	import tablebase
+	return tablebase.load(path)
+
+class Searcher:
+	def __init__(self, seed=None):
+		self.seed = seed
+		self.searches = {}  # difficulty -> mcts.MCTS with its tablebase
+		self.root = None
+		self.log = b""
+
+	def reuse(self, log):
+		# The subtree for the moves played since the last search, if any
+		if self.root is None or not log.startswith(self.log):
+			return None
+		node = self.root
+		for action in log[len(self.log):]:
+			if action in MARKERS:
+				continue
+			node = node.children.get(action)
+			if node is None:
+				return None
+		return node
+
+	def run(self, snapshot, budget):
+		# Per action: (visits, wins); plus iterations this search added
+		game = engine.Game.from_snapshot(snapshot)
+		log = bytes(game.actions)
+		root = self.reuse(log)
+		root = root if root is not None else mcts.Node()
+		before = root.visits
+		search = self.searches.get(game.difficulty)
+		if search is None:
+			search = self.searches[game.difficulty] = mcts.MCTS(seed=self.seed, tablebase=endgame(game.difficulty))
+		search.search(game, budget=budget, root=root)
+		self.root, self.log = root, log
+		stats = {a: (child.visits, child.wins) for a, child in root.children.items()}
+		return stats, root.visits - before
+
+def work(conn, seed):
+	searcher = Searcher(seed)
+	while True:
+		request = conn.recv()
+		if request is None:
+			return
+		id, data, budget = request
+		conn.send((id, *searcher.run(engine.Snapshot.from_bytes(data), budget)))
+
+class HintEngine:
+	def __init__(self, workers=None, budget=0.2, seed=None):
+		# workers=0 searches in this process
+		if workers is None:
+			workers = 0 if sys.platform == "emscripten" else os.cpu_count()
+		self.budget = budget
+		self.requests = 0
+		self.local = None
+		self.workers = []
+		if workers == 0:
+			self.local = Searcher(seed)
+		for i in range(workers):
+			conn, child = multiprocessing.Pipe()
+			process = multiprocessing.Process(target=work, args=(child, engine.derive_seed(seed or 0, i)), daemon=True)
+			process.start()
+			self.workers.append((process, conn))
+
+	def hint(self, game):
+		# (action, win probability, iterations searched), or None once over
+		actions = game.legal_actions()
+		if game.over or not actions:
+			return None
+		table = endgame(game.difficulty)
+		action = table.best_action(game) if table else None
+		if action is not None:
+			return action, 1.0, 0
+		# A little of the budget is kept for shipping the state and replies
+		budget = self.budget * 0.85
+		if self.local:
+			results = [self.local.run(game.snapshot(), budget)]
+		else:
+			self.requests += 1
+			data = game.snapshot().to_bytes()
+			for _, conn in self.workers:
+				conn.send((self.requests, data, budget))
+			deadline = time.perf_counter() + self.budget
+			results = []
+			for _, conn in self.workers:
+				# Replies to an earlier hint that ran late are dropped
+				while conn.poll(max(0, deadline - time.perf_counter())):
+					id, stats, iterations = conn.recv()
+					if id == self.requests:
+						results.append((stats, iterations))
+						break
+
+		visits, wins, iterations = {}, {}, 0
+		for stats, n in results:
+			iterations += n
+			for action, (v, w) in stats.items():
+				visits[action] = visits.get(action, 0) + v
+				wins[action] = wins.get(action, 0) + w
+		tried = [a for a in actions if visits.get(a)]
+		if not tried:
+			return actions[0], 0.0, iterations
+		best = max(tried, key=lambda a: visits[a])
+		return best, wins[best] / visits[best], iterations
+
+	def close(self):
+		for process, conn in self.workers:
+			conn.send(None)
+			process.join(1)
+		self.workers = []
+
+def describe(game, action):
+	if action == engine.SKIP:
+		return "skip this room"
+	index, use = engine.decode(action)
+	card = game.room.card_seq[index]
+	text = f"play card {index + 1} ({engine.card_name(card).replace('_', ' ')})"
+	if game.needs_choice(index):
+		if engine.card_suit[card] == engine.DIAMONDS:
+			text += ", equipping it" if use else ", discarding it"
+		else:
+			text += " with your weapon" if use else " bare-handed"
+	return text
+
+def bench(rooms, hints, workers, budget, difficulty):
+	# Plays the hint's moves from deep in an endless run and times each hint
+	game = engine.Game(1, difficulty)
+	game.can_die = False
+	policy = bots.GreedyPolicy(1)
+	while game.current_room <= rooms:
+		if game.status == "won":
+			game.step(engine.ENDLESS)
+		game.step(policy.choose(game))
+	game.can_die = True
+	game.player.hp = game.player.max_hp
+	print(f"Room {game.current_room}, {len(game.actions)} actions logged, endless: {game.endless_mode}")
+
+	hinter = HintEngine(workers, budget, seed=0)
+	try:
+		for _ in range(hints):
+			if game.over:
+				break
+			start = time.perf_counter()
+			action, chance, iterations = hinter.hint(game)
+			elapsed = time.perf_counter() - start
+			print(f"{elapsed * 1000:6.1f} ms {iterations:6} iterations  {chance:4.0%}  {describe(game, action)}")
+			game.step(action)
+	finally:
+		hinter.close()
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Time hints from deep in an endless run.")
+	parser.add_argument("--rooms", type=int, default=300, help="rooms to play greedily before hinting")
+	parser.add_argument("--hints", type=int, default=10, help="hints to take, playing each")
+	parser.add_argument("--workers", type=int, default=os.cpu_count(), help="0 searches in this process")
+	parser.add_argument("--budget", type=float, default=0.2, help="seconds per hint")
+	parser.add_argument("--difficulty", choices=engine.difficulties, default="easy")
+	args = parser.parse_args(argv)
+	bench(args.rooms, args.hints, args.workers, args.budget, args.difficulty)
+
+if __name__ == "__main__":
+	main()
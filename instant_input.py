@@ -1,9 +1,252 @@
+import codecs
+import contextlib
+import os
+import sys
+import time
+from collections import deque
+
+try:
+	import termios
+	import tty
+except ImportError:  # Windows and the browser
+	termios = None
+
+try:
+	import msvcrt
+except ImportError:
+	msvcrt = None
+
+# Single keystrokes for "instant actions". Inside `with InstantInput()` a
+# POSIX terminal is in cbreak mode (no echo, no Enter needed, Ctrl-C still
+# works), and get_key() returns keys one at a time: "1", "\n", "\x1b[A" for
+# the up arrow, and so on. Each read takes everything the terminal has
+# waiting, so keys typed ahead are queued in order and none is lost or seen
+# twice. Keys typed while outside a `with` are echoed by the terminal, so
+# hold one around the whole session, with paused() around any line input.
+#
+# The browser terminal only hands over whole lines, so there each character
+# of a typed line is a key (an empty line is "\n").
+#
+# Call rendered() once the screen shows the result of the last key to record
+# how long that took, from the key arriving to the frame being out.
+#
+# Usage: python instant_input.py --pty-test
+
+ESCAPE_WAIT = 0.05  # how long a lone ESC waits to become an escape sequence
+
+def split_keys(text):
+	# (keys, incomplete escape sequence left at the end)
+	keys = []
+	i = 0
+	while i < len(text):
+		if text[i] == "\x1b":
+			if i + 1 == len(text):
+				return keys, text[i:]
+			if text[i + 1] in "[O":
+				end = i + 2
+				while end < len(text) and not "\x40" <= text[end] <= "\x7e":
+					end += 1
+				if end == len(text):
+					return keys, text[i:]
+				keys.append(text[i:end + 1])
+				i = end + 1
+				continue
+		keys.append("\n" if text[i] == "\r" else text[i])
+		i += 1
+	return keys, ""
+
 class InstantInput:
+	def __init__(self, stream=None):
+		self.stream = stream or sys.stdin
+		self.keys = deque()  # (key, time it arrived) read but not yet taken
+		self.partial = ""  # start of an escape sequence still arriving
+		self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+		self.depth = 0
+		self.saved = None
+		self.selector = None
+		self.pending = None  # arrival time of the last key taken, until rendered()
+		self.latencies = deque(maxlen=1000)
+		try:
+			self.fd = self.stream.fileno()
+		except (AttributeError, OSError, ValueError):
+			self.fd = None
+		self.posix = termios is not None and self.fd is not None and sys.platform != "emscripten"
+
 	def __enter__(self):
+		if self.depth == 0 and self.posix and os.isatty(self.fd):
+			self.saved = termios.tcgetattr(self.fd)
+			tty.setcbreak(self.fd, termios.TCSANOW)
+		self.depth += 1
 		return self
 
 	def __exit__(self, exc_type, exc, tb):
-		pass
+		self.depth -= 1
+		if self.depth == 0 and self.saved is not None:
+			# TCSADRAIN, not TCSAFLUSH: keys typed ahead stay readable
+			termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved)
+			self.saved = None
+
+	@contextlib.contextmanager
+	def paused(self):
+		# The terminal's own line mode (echo, editing) back while inside
+		if self.saved is None:
+			yield
+			return
+		termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved)
+		try:
+			yield
+		finally:
+			tty.setcbreak(self.fd, termios.TCSANOW)
+
+	def fill(self, timeout):
+		# Queues whatever keys are waiting; False if none came within timeout
+		if not self.posix:
+			return self.fill_other()
+		if self.selector is None:
+			import selectors
+			self.selector = selectors.DefaultSelector()
+			self.selector.register(self.fd, selectors.EVENT_READ)
+		if not self.selector.select(timeout):
+			if self.partial:
+				# A lone ESC (or a sequence that never finished) is a key too
+				self.keys.extend((key, time.perf_counter()) for key in self.partial)
+				self.partial = ""
+				return True
+			return False
+		data = os.read(self.fd, 4096)
+		if not data:
+			raise EOFError
+		now = time.perf_counter()
+		keys, self.partial = split_keys(self.partial + self.decoder.decode(data))
+		self.keys.extend((key, now) for key in keys)
+		return bool(keys) or bool(self.partial)
+
+	def fill_other(self):
+		if msvcrt and self.stream is sys.stdin:
+			text = msvcrt.getwch()
+			while msvcrt.kbhit():
+				text += msvcrt.getwch()
+		else:
+			text = self.stream.readline() if self.stream is not sys.stdin else input()
+			text = text.rstrip("\r\n") or "\n"
+		now = time.perf_counter()
+		self.keys.extend((key, now) for key in split_keys(text)[0])
+		return True
+
+	def get_key(self, timeout=None):
+		# The next key, or None if none arrives within timeout seconds
+		deadline = None if timeout is None else time.perf_counter() + timeout
+		while not self.keys:
+			wait = None if deadline is None else max(0, deadline - time.perf_counter())
+			if self.partial:
+				wait = ESCAPE_WAIT if wait is None else min(wait, ESCAPE_WAIT)
+			if not self.fill(wait) and deadline is not None and time.perf_counter() >= deadline:
+				return None
+		key, arrived = self.keys.popleft()
+		self.pending = arrived
+		return key
+
+	def rendered(self):
+		if self.pending is not None:
+			self.latencies.append(time.perf_counter() - self.pending)
+			self.pending = None
+
+	def latency(self, p):
+		# Keypress-to-render latency percentile in seconds, None if unmeasured
+		if not self.latencies:
+			return None
+		ordered = sorted(self.latencies)
+		return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+"""
+################
+### PTY TEST ###
+################
+"""
+
+def echo_keys():
+	# Child side: echoes every key until "q", then its own latency figures
+	with InstantInput() as keys:
+		print("ready", flush=True)
+		while True:
+			key = keys.get_key()
+			if key == "q":
+				break
+			if key == "l":
+				with keys.paused():
+					key = input("line?\n")
+			elif key == "b":
+				# Busy, as when the game works between reads; keys typed now
+				# must wait unechoed
+				with keys:
+					time.sleep(0.2)
+			sys.stdout.write(repr(key) + "\n")
+			sys.stdout.flush()
+			keys.rendered()
+	print(f"latency p50 {keys.latency(0.5) * 1e3:.3f} ms p99 {keys.latency(0.99) * 1e3:.3f} ms", flush=True)
+
+def pty_test(presses):
+	import pty
+	pid, fd = pty.fork()
+	if pid == 0:
+		echo_keys()
+		os._exit(0)
+
+	buffer = b""
+	def read_line():
+		nonlocal buffer
+		while b"\n" not in buffer:
+			buffer += os.read(fd, 4096)
+		line, buffer = buffer.split(b"\n", 1)
+		return line.decode().strip()
+
+	read_line()  # ready
+	# Typed ahead in one burst: keys, arrows, Enter, a lone ESC and non-ASCII
+	burst = ["1", "2", "\x1b[A", "\n", "3", "\x1bOB", "é", "\x1b"]
+	os.write(fd, "".join(k if k != "\n" else "\r" for k in burst).encode())
+	got = [eval(read_line()) for _ in burst]
+	print(f"typed ahead: {len(burst)} keys sent, {'all' if got == burst else 'NOT all'} received once, in order")
+
+	# Keys typed while the reader is busy between reads
+	os.write(fd, b"b")
+	time.sleep(0.05)
+	os.write(fd, b"234")
+	busy = [eval(read_line()) for _ in "b234"]
+	print(f"typed while busy: {'not echoed' if busy == list('b234') else 'ECHOED or lost'}")
+
+	# A line typed while paused is echoed by the terminal, as input() expects
+	os.write(fd, b"l")
+	read_line()  # line?
+	os.write(fd, b"abc\r")
+	line_ok = read_line() == "abc" and eval(read_line()) == "abc"
+	print(f"paused line input: {'echoed and read' if line_ok else 'NOT read correctly'}")
+
+	latencies = []
+	for i in range(presses):
+		key = str(i % 10)
+		start = time.perf_counter()
+		os.write(fd, key.encode())
+		if eval(read_line()) != key:
+			raise AssertionError("key mismatch")
+		latencies.append(time.perf_counter() - start)
+	os.write(fd, b"q")
+	latencies.sort()
+	print(f"{presses} single presses, keypress to echo p50 {latencies[len(latencies) // 2] * 1e3:.3f} ms p99 {latencies[int(0.99 * len(latencies))] * 1e3:.3f} ms")
+	print("child:", read_line())
+	os.waitpid(pid, 0)
+	if got != burst or busy != list("b234") or not line_ok:
+		sys.exit(1)
+
+def main(argv=None):
+	import argparse
+	parser = argparse.ArgumentParser(description="Echo single keys, or check them through a pseudo-terminal.")
+	parser.add_argument("--pty-test", action="store_true", help="type into a pty and check every key arrives once")
+	parser.add_argument("--presses", type=int, default=500, help="single presses timed by --pty-test")
+	args = parser.parse_args(argv)
+	if args.pty_test:
+		pty_test(args.presses)
+	else:
+		echo_keys()
 
-	def get_key(self):
-		pass
\ No newline at end of file
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,112 @@
+import math
+import random
+import time
+import engine
+import bots
+
+# Monte Carlo tree search over determinised deals. The deck's order is
+# hidden from the player, so every iteration resets a copy of the game and
+# reseeds its RNG: its future draws are a fresh random deal from the cards
+# that are really left. The tree is open-loop: a node is the sequence of actions
+# from the root, and its statistics average over all the deals tried.
+#
+# An iteration walks down by UCT, steps once into an untried action, and
+# finishes with a greedy rollout. A rollout scores 1 for a win (in endless
+# mode: surviving `horizon` more rooms) and otherwise half the share of the
+# run it got through, so early on, when nothing wins yet, the search still
+# prefers the lines that last longest. wins counts real wins only, which is
+# what win_probability() reports.
+
+HORIZON = 10
+
+class Node:
+	__slots__ = ("visits", "score", "wins", "children")
+
+	def __init__(self):
+		self.visits = 0
+		self.score = 0.0
+		self.wins = 0
+		self.children = {}
+
+	def win_probability(self):
+		return self.wins / self.visits if self.visits else 0.0
+
+class MCTS:
+	def __init__(self, exploration=0.7, horizon=HORIZON, seed=None, tablebase=None):
+		self.exploration = exploration
+		self.horizon = horizon
+		self.rng = random.Random(seed)
+		self.rollout_policy = bots.GreedyPolicy(seed, tablebase)
+
+	def search(self, game, iterations=None, budget=None, root=None):
+		# Runs until `iterations` are done or `budget` seconds have passed,
+		# growing root (a fresh tree if None) and returning it
+		root = root if root is not None else Node()
+		# Every iteration loads this copy back to the root, which only cuts
+		# its action log back to the root's length
+		game = engine.Game.from_snapshot(game.snapshot())
+		snapshot = game.snapshot()
+		deadline = time.perf_counter() + budget if budget is not None else None
+		done = 0
+		while (iterations is None or done < iterations) and (deadline is None or time.perf_counter() < deadline):
+			self.iterate(game, snapshot, root)
+			done += 1
+		return root
+
+	def iterate(self, game, snapshot, root):
+		game.load(snapshot)
+		game.rng.seed(self.rng.getrandbits(64))
+		start_room = game.current_room
+		node = root
+		path = [root]
+		while not game.over and node.visits:
+			action = self.select(node, game.legal_actions())
+			game.step(action)
+			node = node.children.get(action)
+			if node is None:
+				node = path[-1].children[action] = Node()
+				path.append(node)
+				break
+			path.append(node)
+		score, won = self.rollout(game, start_room)
+		for node in path:
+			node.visits += 1
+			node.score += score
+			node.wins += won
+
+	def select(self, node, actions):
+		# UCT, trying every action once first
+		children = node.children
+		log_visits = math.log(node.visits)
+		best, best_value = None, -1.0
+		for action in actions:
+			child = children.get(action)
+			if child is None or not child.visits:
+				return action
+			value = child.score / child.visits + self.exploration * math.sqrt(log_visits / child.visits)
+			if value > best_value:
+				best, best_value = action, value
+		return best
+
+	def rollout(self, game, start_room):
+		endless = game.endless_mode
+		choose = self.rollout_policy.choose
+		while not game.over and not (endless and game.current_room - start_room >= self.horizon):
+			game.step(choose(game))
+		if endless:
+			if game.status != "lost":
+				return 1.0, 1
+			return 0.5 * (game.current_room - start_room) / self.horizon, 0
+		if game.status == "won":
+			return 1.0, 1
+		room = game.room
+		progress = 1 - (len(room.deck) + len(room.card_seq)) / len(room.original_deck)
+		return 0.5 * progress, 0
+
+	def best(self, root, actions):
+		# The most visited legal action and its estimated win probability
+		tried = [a for a in actions if a in root.children]
+		if not tried:
+			return actions[0], 0.0
+		action = max(tried, key=lambda a: root.children[a].visits)
+		return action, root.children[action].win_probability()
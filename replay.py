@@ -0,0 +1,176 @@
+import struct
+import sys
+import time
+import engine
+
+# Replay logs: a run's seed, difficulty and action stream, packed two actions
+# per byte, plus the final state so a replay can be checked. Deals come from
+# the seed, so re-running the actions rebuilds the exact run.
+#
+#   magic, version, difficulty, max_hp
+#   varint seed (zigzag), varint action count, packed actions
+#   status, varint hp (zigzag), varint current_room
+#
+# Archives are a stream of logs, each prefixed with its varint length.
+#
+# Usage: python replay.py runs.scrl
+
+MAGIC = b"SCRL"
+VERSION = 1
+HEADER = struct.Struct("<4sBBB")
+statuses = ["playing", "won", "lost"]
+
+class ReplayError(ValueError):
+	pass
+
+def write_varint(out, n):
+	while n > 0x7F:
+		out.append(n & 0x7F | 0x80)
+		n >>= 7
+	out.append(n)
+
+def read_varint(data, at):
+	n = shift = 0
+	while True:
+		byte = data[at]
+		at += 1
+		n |= (byte & 0x7F) << shift
+		if byte < 0x80:
+			return n, at
+		shift += 7
+
+def zigzag(n):
+	return n << 1 if n >= 0 else (-n << 1) - 1
+
+def unzigzag(n):
+	return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+class Replay:
+	def __init__(self, seed, difficulty, max_hp, actions, status, hp, current_room):
+		self.seed = seed
+		self.difficulty = difficulty
+		self.max_hp = max_hp
+		self.actions = actions
+		self.status = status
+		self.hp = hp
+		self.current_room = current_room
+
+	@classmethod
+	def from_game(cls, game):
+		return cls(
+			game.seed, game.difficulty, game.player.max_hp, bytes(game.actions),
+			game.status, game.player.hp, game.current_room
+		)
+
+	def to_bytes(self):
+		out = bytearray(HEADER.pack(MAGIC, VERSION, engine.difficulties.index(self.difficulty), self.max_hp))
+		write_varint(out, zigzag(self.seed))
+		write_varint(out, len(self.actions))
+		actions = self.actions
+		if len(actions) % 2:
+			actions += b"\0"
+		out += bytes(a | b << 4 for a, b in zip(actions[::2], actions[1::2]))
+		out.append(statuses.index(self.status))
+		write_varint(out, zigzag(self.hp))
+		write_varint(out, self.current_room)
+		return bytes(out)
+
+	@classmethod
+	def from_bytes(cls, data):
+		try:
+			return cls.unpack(data)
+		except (IndexError, struct.error):
+			raise ReplayError("Truncated replay log")
+
+	@classmethod
+	def unpack(cls, data):
+		magic, version, difficulty, max_hp = HEADER.unpack_from(data)
+		if magic != MAGIC:
+			raise ReplayError("Not a replay log")
+		if version != VERSION:
+			raise ReplayError(f"Unsupported replay version: {version}")
+		seed, at = read_varint(data, HEADER.size)
+		count, at = read_varint(data, at)
+		packed = data[at:at + (count + 1) // 2]
+		at += len(packed)
+		actions = bytearray(len(packed) * 2)
+		actions[::2] = bytes(b & 0x0F for b in packed)
+		actions[1::2] = bytes(b >> 4 for b in packed)
+		status = data[at]
+		hp, at = read_varint(data, at + 1)
+		current_room, at = read_varint(data, at)
+		return cls(
+			unzigzag(seed), engine.difficulties[difficulty], max_hp, bytes(actions[:count]),
+			statuses[status], unzigzag(hp), current_room
+		)
+
+	def run(self):
+		# Re-plays the actions on a fresh game and returns it
+		game = engine.Game(self.seed, self.difficulty, self.max_hp)
+		step = game.step
+		try:
+			for action in self.actions:
+				if action == engine.TOGGLE_CAN_DIE:
+					game.can_die = not game.can_die
+				elif action == engine.TOGGLE_INFINITE_SKIPS:
+					game.infinite_skips = not game.infinite_skips
+				elif action == engine.UNDO:
+					game.actions.append(action)
+				else:
+					step(action)
+		except ValueError as e:
+			raise ReplayError(f"Seed {self.seed}: action {len(game.actions)} is illegal: {e}")
+		return game
+
+	def verify(self):
+		# Raises ReplayError unless the replay ends exactly where the log did
+		game = self.run()
+		final = (game.status, game.player.hp, game.current_room)
+		if final != (self.status, self.hp, self.current_room):
+			raise ReplayError(
+				f"Seed {self.seed}: log ends {self.status} with {self.hp} HP in room {self.current_room}, "
+				f"replay ends {final[0]} with {final[1]} HP in room {final[2]}"
+			)
+		return game
+
+def write_archive(replays, out):
+	# out is a binary file; replays is any iterable of Replay or log bytes
+	for replay in replays:
+		data = replay if isinstance(replay, bytes) else replay.to_bytes()
+		prefix = bytearray()
+		write_varint(prefix, len(data))
+		out.write(prefix)
+		out.write(data)
+
+def read_archive(data):
+	# Yields the log bytes in an archive (bytes or mmap)
+	at = 0
+	while at < len(data):
+		size, at = read_varint(data, at)
+		yield data[at:at + size]
+		at += size
+
+def main(argv=None):
+	import argparse
+	parser = argparse.ArgumentParser(description="Replay and check recorded runs.")
+	parser.add_argument("archive", help="replay archive (see simulate.py --replays)")
+	args = parser.parse_args(argv)
+
+	with open(args.archive, "rb") as f:
+		data = f.read()
+	start = time.perf_counter()
+	runs = failed = 0
+	for log in read_archive(data):
+		runs += 1
+		try:
+			Replay.from_bytes(log).verify()
+		except ReplayError as e:
+			failed += 1
+			print(e, file=sys.stderr)
+	elapsed = time.perf_counter() - start
+	print(f"{runs} runs replayed, {failed} mismatched, {runs / max(elapsed, 1e-9):.0f} runs/s")
+	if failed:
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
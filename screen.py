@@ -0,0 +1,175 @@
+import io
+import os
+import sys
+import time
+import unicodedata
+
+# Differential terminal output. A frame is a list of lines for the top of
+# the screen; draw() compares it with what the terminal shows and repaints
+# only the lines that changed, each with a cursor-position escape, then
+# erases everything below the frame (prompts, typed input, event messages)
+# and leaves the cursor there. The whole update goes out in one write.
+# Within a changed line, output starts at the first column that differs,
+# as long as no colour is active there.
+#
+# Anything that writes over the screen on its own (clean(), full-screen
+# menus) must call invalidate() so the next frame is drawn in full. Text
+# written under the frame (prompts, messages, the Enter ending typed input)
+# must be passed to below(): once it adds up to more than fits under the
+# frame the terminal has scrolled, and the next frame is drawn in full too.
+#
+# Usage: python screen.py --games 20
+
+def move(row, column=0):
+	return f"\033[{row + 1};{column + 1}H"
+
+combining = unicodedata.combining
+
+def terminal_size():
+	# shutil.get_terminal_size(), without importing shutil (and through it
+	# re), which was most of the game's start-up time
+	try:
+		columns = int(os.environ.get("COLUMNS", 0))
+		lines = int(os.environ.get("LINES", 0))
+	except ValueError:
+		columns = lines = 0
+	if columns <= 0 or lines <= 0:
+		try:
+			size = os.get_terminal_size(sys.__stdout__.fileno())
+		except (AttributeError, ValueError, OSError):
+			size = os.terminal_size((80, 24))
+		columns = columns if columns > 0 else size.columns
+		lines = lines if lines > 0 else size.lines
+	return os.terminal_size((columns, lines))
+
+def common_start(old, new):
+	# (index into new, screen column) where the two lines start to differ,
+	# moved back to a point outside any escape sequence or coloured text
+	limit = 0
+	while limit < len(old) and limit < len(new) and old[limit] == new[limit]:
+		limit += 1
+	cut = column = visible = i = 0
+	coloured = False
+	while i < limit:
+		if new[i] == "\033":
+			end = new.find("m", i)
+			if end < 0 or end >= limit:
+				break
+			coloured = new[i:end + 1] != "\033[0m"
+			i = end + 1
+		else:
+			if not combining(new[i]):
+				visible += 1
+			i += 1
+		# Combining marks (strike()) belong to the cell before them, in
+		# either line
+		if coloured or (i < len(new) and combining(new[i])) or (i < len(old) and combining(old[i])):
+			continue
+		cut, column = i, visible
+	return cut, column
+
+ERASE_LINE = "\033[K"
+ERASE_BELOW = "\033[J"
+
+class Screen:
+	def __init__(self, out=None):
+		self.out = out
+		self.lines = []  # what the terminal shows, top row first
+		self.size = None
+		self.rows_below = 0  # rows the cursor has moved down since the frame
+
+	def below(self, text):
+		columns = self.size.columns if self.size else 80
+		rows = text.count("\n")
+		for part in text.split("\n"):
+			# Long lines wrap onto more rows
+			rows += max(0, len(part) - 1) // columns
+		self.rows_below += rows
+
+	def invalidate(self):
+		self.lines = []
+
+	def draw(self, lines):
+		# Returns how many characters were written
+		size = terminal_size()
+		if size != self.size or len(self.lines) + self.rows_below >= size.lines:
+			self.size = size
+			self.lines = []
+		self.rows_below = 0
+		out = self.out or sys.stdout
+		if len(lines) >= size.lines:
+			# Taller than the terminal, so rows can't be addressed: print it
+			data = "\033[H\033[2J" + "\n".join(lines) + "\n"
+			out.write(data)
+			out.flush()
+			return len(data)
+		shown = self.lines
+		parts = []
+		for i, line in enumerate(lines):
+			if i >= len(shown):
+				parts.append(move(i) + line + ERASE_LINE)
+			elif shown[i] != line:
+				cut, column = common_start(shown[i], line)
+				parts.append(move(i, column) + line[cut:] + ERASE_LINE)
+		parts.append(move(len(lines)) + ERASE_BELOW)
+		self.lines = list(lines)
+		data = "".join(parts)
+		out.write(data)
+		out.flush()
+		return len(data)
+
+"""
+#################
+### BENCHMARK ###
+#################
+"""
+
+def full_repaint(lines, out):
+	# What the game did before: clear the terminal and print every line
+	data = "\033[2J\033[H" + "".join(line + "\n" for line in lines)
+	out.write(data)
+	return len(data)
+
+def bench(games, difficulty):
+	# Renders every frame of some greedy games both ways into a buffer
+	import engine
+	import bots
+	import scoundrel
+	frames = []
+	compose = 0.0
+	for seed in range(games):
+		game = engine.Game(seed, difficulty)
+		scoundrel.game, scoundrel.room, scoundrel.player = game, game.room, game.player
+		scoundrel.difficulty = difficulty
+		policy = bots.GreedyPolicy(seed)
+		while not game.over:
+			start = time.perf_counter()
+			frames.append(scoundrel.room_frame())
+			compose += time.perf_counter() - start
+			game.step(policy.choose(game))
+
+	out = io.StringIO()
+	start = time.perf_counter()
+	before = sum(full_repaint(frame, out) for frame in frames)
+	before_time = time.perf_counter() - start
+
+	screen = Screen(out)
+	start = time.perf_counter()
+	after = sum(screen.draw(frame) for frame in frames)
+	after_time = time.perf_counter() - start
+
+	n = len(frames)
+	print(f"{n} frames, composed in {compose / n * 1000:.3f} ms/frame")
+	print(f"full repaint: {before / n:7.0f} bytes/frame {before_time / n * 1000:.3f} ms/frame")
+	print(f"differential: {after / n:7.0f} bytes/frame {after_time / n * 1000:.3f} ms/frame ({before / after:.1f}x fewer bytes)")
+
+def main(argv=None):
+	import argparse
+	parser = argparse.ArgumentParser(description="Compare full and differential repaints of the room screen.")
+	parser.add_argument("--games", type=int, default=20, help="greedy games whose frames are rendered")
+	parser.add_argument("--difficulty", default="easy")
+	args = parser.parse_args(argv)
+	bench(args.games, args.difficulty)
+
+if __name__ == "__main__":
+	main()
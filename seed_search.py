@@ -0,0 +1,223 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from multiprocessing import Pool
+import engine
+import solver
+from engine import card_ids, card_strength, card_suit, suits, difficulty_deck
+
+# Finds seeds whose deal matches a set of conditions, scanning a range of
+# seeds on every core. Conditions look at the order the seed deals its cards
+# in when nobody skips: 4 cards, then 3 per room. That order doesn't depend
+# on how the cards are played, so it comes straight from the RNG, and only
+# as far as a condition reads it.
+#
+#   hearts<=2@5                  at most 2 hearts in the first 5 rooms
+#   diamonds>7>=2@3              at least 2 diamonds above 7 in the first 3
+#   A_of_spades before diamonds>7
+#   winnable                     the solver can win it (skips included)
+#
+# A card set is a card name, a suit, "monsters" or "potions", optionally
+# followed by ">N" to keep the cards above strength N. Conditions run
+# cheapest first and a seed is dropped at the first one that fails.
+#
+# Usage: python seed_search.py --difficulty normal --where winnable --where "hearts<=2@5"
+
+class Deal:
+	# A seed's cards in dealt order, drawn exactly as Room.draw would
+	def __init__(self, seed, difficulty):
+		self.seed = seed
+		self.difficulty = difficulty
+		self.rng = random.Random(seed)
+		self.deck = difficulty_deck(difficulty)
+		self.cards = []
+
+	def deal(self):
+		# Deals the next room's cards; False once the deck is empty
+		deck = self.deck
+		if not deck:
+			return False
+		amount = min(4 if not self.cards else 3, len(deck))
+		picks = self.rng.sample(range(len(deck)), k=amount)
+		self.cards.extend(deck[i] for i in picks)
+		for i in sorted(picks, reverse=True):
+			del deck[i]
+		return True
+
+	def rooms(self, n):
+		# Cards dealt by the time room n is on the table
+		wanted = 4 + 3 * (n - 1)
+		while len(self.cards) < wanted and self.deal():
+			pass
+		return self.cards[:wanted]
+
+	def __iter__(self):
+		i = 0
+		while i < len(self.cards) or self.deal():
+			yield self.cards[i]
+			i += 1
+
+"""
+##################
+### CONDITIONS ###
+##################
+"""
+
+def card_set(spec):
+	# The set of cards a spec names, as a list of 52 booleans
+	name, _, above = spec.partition(">")
+	above = int(above) if above else 0
+	if name in card_ids:
+		wanted = {card_ids[name]}
+	elif name in suits:
+		wanted = {c for c in range(len(card_suit)) if card_suit[c] == suits.index(name)}
+	elif name == "monsters":
+		wanted = {c for c in range(len(card_suit)) if engine.card_is_monster[c]}
+	elif name == "potions":
+		wanted = {c for c in range(len(card_suit)) if card_suit[c] == engine.HEARTS}
+	else:
+		raise ValueError(f"Unknown cards: {name}")
+	return [c in wanted and card_strength[c] > above for c in range(len(card_suit))]
+
+class Count:
+	cost = 1
+
+	def __init__(self, cards, op, n, rooms):
+		self.cards = card_set(cards)
+		self.at_most = op == "<="
+		self.n = n
+		self.rooms = rooms
+
+	def __call__(self, deal):
+		cards = self.cards
+		count = sum(cards[c] for c in deal.rooms(self.rooms))
+		return count <= self.n if self.at_most else count >= self.n
+
+class Before:
+	cost = 1
+
+	def __init__(self, first, then):
+		self.first = card_set(first)
+		self.then = card_set(then)
+
+	def __call__(self, deal):
+		for card in deal:
+			if self.first[card]:
+				return True
+			if self.then[card]:
+				return False
+		return False
+
+class Winnable:
+	cost = 100
+
+	def __call__(self, deal):
+		found = solver.SeedSolver(deal.seed, deal.difficulty)
+		return bool(found.reach(found.root, 1))
+
+COUNT = re.compile(r"^(\S+?)(<=|>=)(\d+)(?:@(\d+))?$")
+BEFORE = re.compile(r"^(\S+)\s+before\s+(\S+)$")
+
+def parse(spec):
+	spec = spec.strip()
+	if spec == "winnable":
+		return Winnable()
+	match = COUNT.match(spec)
+	if match:
+		cards, op, n, rooms = match.groups()
+		return Count(cards, op, int(n), int(rooms) if rooms else 52)
+	match = BEFORE.match(spec)
+	if match:
+		return Before(*match.groups())
+	raise ValueError(f"Can't read condition: {spec}")
+
+def conditions(specs):
+	return sorted((parse(spec) for spec in specs), key=lambda c: c.cost)
+
+"""
+##############
+### SEARCH ###
+##############
+"""
+
+def search_chunk(chunk):
+	# Workers parse the conditions themselves; returns the matching seeds
+	# and the CPU time spent
+	start, count, difficulty, specs = chunk
+	checks = conditions(specs)
+	begin = time.process_time()
+	found = []
+	for seed in range(start, start + count):
+		deal = Deal(seed, difficulty)
+		if all(check(deal) for check in checks):
+			found.append(seed)
+	return found, time.process_time() - begin
+
+def search(start, count, difficulty, specs, jobs=None, chunk_size=5000, limit=None, stats=None):
+	# Yields matching seeds in order. Stops early once `limit` are found.
+	# stats, if given, collects "seeds" scanned and worker "cpu" seconds.
+	conditions(specs)  # fail here on a bad spec, not in a worker
+	work = [(s, min(chunk_size, start + count - s), difficulty, specs) for s in range(start, start + count, chunk_size)]
+	stats = stats if stats is not None else {}
+	stats["seeds"] = stats["cpu"] = 0
+	found = 0
+	pool = Pool(jobs) if jobs != 1 else None
+	try:
+		results = pool.imap(search_chunk, work) if pool else map(search_chunk, work)
+		for (s, n, _, _), (seeds, cpu) in zip(work, results):
+			stats["seeds"] += n
+			stats["cpu"] += cpu
+			for seed in seeds:
+				yield seed
+				found += 1
+				if found == limit:
+					return
+	finally:
+		if pool:
+			pool.terminate()
+			pool.join()
+
+def validate(difficulty, games=200):
+	# Deal must see the same cards a real game deals when nobody skips
+	for seed in range(games):
+		game = engine.Game(seed, difficulty)
+		game.can_die = False
+		dealt = list(game.room.card_seq)
+		while not game.over:
+			before = len(game.room.card_seq)
+			game.step(engine.pick(0))
+			dealt += game.room.card_seq[before - 1:]
+		if dealt != Deal(seed, difficulty).rooms(52):
+			raise AssertionError(f"Seed {seed} deals differently")
+	print(f"Deals match the engine on {games} seeds")
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Find seeds whose deals match some conditions.")
+	parser.add_argument("--where", action="append", default=[], metavar="CONDITION", help="repeatable; see the top of seed_search.py")
+	parser.add_argument("--difficulty", choices=engine.difficulties, default="easy")
+	parser.add_argument("--start", type=int, default=0, help="first seed to try")
+	parser.add_argument("--count", type=int, default=100000, help="seeds to try")
+	parser.add_argument("--limit", type=int, help="stop after this many matches")
+	parser.add_argument("--jobs", type=int, default=os.cpu_count())
+	parser.add_argument("--chunk-size", type=int, default=5000, help="seeds per task sent to a worker")
+	parser.add_argument("--validate", action="store_true", help="check the deals against the engine first")
+	args = parser.parse_args(argv)
+
+	sys.setrecursionlimit(10000)
+	if args.validate:
+		validate(args.difficulty)
+	stats = {}
+	start = time.perf_counter()
+	matches = 0
+	for seed in search(args.start, args.count, args.difficulty, args.where, args.jobs, args.chunk_size, args.limit, stats):
+		print(seed, flush=True)
+		matches += 1
+	elapsed = time.perf_counter() - start
+	print(f"{matches} of {stats['seeds']} seeds matched in {elapsed:.2f}s", file=sys.stderr)
+	print(f"{stats['seeds'] / max(stats['cpu'], 1e-9):.0f} seeds/s per core, {stats['seeds'] / elapsed:.0f} seeds/s on {args.jobs} jobs", file=sys.stderr)
+
+if __name__ == "__main__":
+	main()
@@ -1,7 +1,114 @@
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import argparse
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import HTTPServer, ThreadingHTTPServer, SimpleHTTPRequestHandler
+import engine
+import daily
+import bundle
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Serves the PyScript page. The page and the files its py-config ships are
+# read at startup, any other file on its first request, and each is stored
+# identity, gzip and (with the brotli package) br encoded in a cache
+# directory, so responses go out with sendfile. Every encoding has its own
+# ETag. Files that change on disk are picked up on their next request.
+#
+# GET /daily (or /daily/<difficulty>) returns today's challenge seeds with
+# their ratings, from the cache daily.py keeps up to date in the background.
+#
+# Usage: python server.py [--port 8000]
+#        python server.py --bench
+
+MAX_ASSET = 8 * 1024 * 1024
+
+
+class Asset:
+    def __init__(self, path, cache_dir):
+        with open(path, "rb") as f:
+            data = f.read()
+        stat = os.stat(path)
+        self.path = path
+        self.mtime = stat.st_mtime_ns
+        digest = hashlib.sha1(data).hexdigest()[:20]
+        # encoding -> (file to send, size). Every encoding, identity too, is
+        # a copy named after the content, so a rebuild never touches a file
+        # another thread may still be sending.
+        self.files = {}
+        variants = [("identity", bytes), ("gzip", lambda d: gzip.compress(d, 9, mtime=0))]
+        if brotli:
+            variants.insert(1, ("br", lambda d: brotli.compress(d, quality=11)))
+        prefix = os.path.join(cache_dir, hashlib.sha1(path.encode()).hexdigest() + "-" + digest)
+        for encoding, compress in variants:
+            packed = compress(data)
+            if encoding == "identity" or len(packed) < len(data):
+                name = prefix + "." + encoding
+                if not os.path.exists(name):
+                    temp = f"{name}.{threading.get_ident()}.tmp"
+                    with open(temp, "wb") as f:
+                        f.write(packed)
+                    os.replace(temp, name)
+                self.files[encoding] = (name, len(packed))
+        suffixes = {"identity": "", "gzip": "-gz", "br": "-br"}
+        self.etags = {encoding: f'"{digest}{suffixes[encoding]}"' for encoding in self.files}
+
+    def choose(self, accept_encoding):
+        accepted = {e.split(";")[0].strip() for e in accept_encoding.split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.files:
+                return encoding
+        return "identity"
+
+
+class AssetCache:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.dir = tempfile.mkdtemp(prefix="scoundrel-assets-")
+        self.assets = {}
+        self.lock = threading.Lock()
+        page = os.path.join(self.root, "index.html")
+        if os.path.isfile(page):
+            self.get(page)
+            for name in bundle.shipped_modules(page):
+                self.get(os.path.join(self.root, name))
+
+    def get(self, path):
+        # Up-to-date Asset for a file path, or None if it isn't a servable file
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path) or stat.st_size > MAX_ASSET:
+            return None
+        asset = self.assets.get(path)
+        if asset is None or asset.mtime != stat.st_mtime_ns:
+            with self.lock:
+                asset = self.assets[path] = Asset(path, self.dir)
+        return asset
+
+    def close(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
 
 
 class COOPCOEPHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and the sendfile body go out separately; without this the
+    # body waits on the client's delayed ACK
+    disable_nagle_algorithm = True
+    assets = None  # AssetCache, set by make_server()
+    daily_seeds = None  # daily.DailyCache, set by make_server()
+
     def end_headers(self):
         # CORS header
         self.send_header("Access-Control-Allow-Origin", "*")
@@ -11,10 +118,180 @@ class COOPCOEPHandler(SimpleHTTPRequestHandler):
         self.send_header("Cross-Origin-Resource-Policy", "cross-origin")
         super().end_headers()
 
+    def do_GET(self):
+        self.send_asset(head=False)
+
+    def do_HEAD(self):
+        self.send_asset(head=True)
+
+    def send_asset(self, head):
+        if self.daily_seeds and (self.path == "/daily" or self.path.startswith("/daily/")):
+            return self.send_daily(head)
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        asset = self.assets.get(path) if self.assets else None
+        if asset is None:
+            # Directory listings, 404s and oversized files
+            return super().do_HEAD() if head else super().do_GET()
+
+        encoding = asset.choose(self.headers.get("Accept-Encoding", ""))
+        etag = asset.etags[encoding]
+        if_none_match = {tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")}
+        if etag in if_none_match or "*" in if_none_match:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+
+        name, size = asset.files[encoding]
+        self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Length", str(size))
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if not head:
+            self.wfile.flush()
+            with open(name, "rb") as f:
+                self.connection.sendfile(f)
+
+    def send_daily(self, head):
+        wanted = self.path.split("?")[0].strip("/").split("/")[1:]
+        if any(d not in engine.difficulties for d in wanted) or len(wanted) > 1:
+            return self.send_error(404)
+        day = daily.today()
+        entries = {d: self.daily_seeds.get(day, d) for d in wanted or engine.difficulties}
+        if None in entries.values():
+            status, body = 503, {"error": "today's seeds are still being rated"}
+        else:
+            status, body = 200, entries[wanted[0]] if wanted else entries
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 503:
+            self.send_header("Retry-After", "60")
+        else:
+            self.send_header("Cache-Control", "max-age=300")
+        self.end_headers()
+        if not head:
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(host, port, directory, quiet=False, daily_path=None):
+    class Handler(COOPCOEPHandler):
+        assets = AssetCache(directory)
+        daily_seeds = daily.DailyCache(daily_path) if daily_path else None
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+    server = Server((host, port), Handler)
+    server.quiet = quiet
+    return server
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections isn't worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+"""
+#################
+### BENCHMARK ###
+#################
+"""
+
+def hammer(host, port, paths, headers, seconds, clients):
+    # Requests per second from `clients` keep-alive connections
+    counts = [0] * clients
+    deadline = time.perf_counter() + seconds
+    def client(i):
+        conn = http.client.HTTPConnection(host, port)
+        while time.perf_counter() < deadline:
+            for path in paths:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                counts[i] += 1
+        conn.close()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / seconds
+
+
+def bench(host, port, directory, seconds, clients):
+    paths = ["/", "/scoundrel.py", "/cards_ascii.py", "/engine.py"]
+    server = make_server(host, port, directory, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    etags = {}
+    for path in paths:
+        conn = http.client.HTTPConnection(host, port)
+        conn.request("GET", path)
+        etags[path] = conn.getresponse().getheader("ETag")
+        conn.close()
+    cases = [
+        ("identity", {}),
+        ("gzip", {"Accept-Encoding": "gzip"}),
+        ("304", {"If-None-Match": etags["/scoundrel.py"]}),
+    ]
+    for name, headers in cases:
+        p = ["/scoundrel.py"] if name == "304" else paths
+        print(f"{name:>9}: {hammer(host, port, p, headers, seconds, clients):8.0f} req/s")
+    server.shutdown()
+    server.server_close()
+    server.RequestHandlerClass.assets.close()
+
+    # The previous setup: single-threaded HTTP/1.0, reading files per request
+    class Plain(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+        def log_message(self, format, *args):
+            pass
+    plain = HTTPServer((host, port), Plain)
+    threading.Thread(target=plain.serve_forever, daemon=True).start()
+    print(f"{'before':>9}: {hammer(host, port, paths, {}, seconds, clients):8.0f} req/s")
+    plain.shutdown()
+    plain.server_close()
+
 
 if __name__ == "__main__":
-    host = "localhost"
-    port = 8000
+    parser = argparse.ArgumentParser(description="Serve the PyScript page.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--directory", default=os.getcwd())
+    parser.add_argument("--daily-cache", default=daily.CACHE_FILE, help="daily challenge ratings, refreshed in the background")
+    parser.add_argument("--no-daily", action="store_true", help="don't serve /daily or run the rating job")
+    parser.add_argument("--bench", action="store_true", help="measure requests per second against a local server")
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--clients", type=int, default=8)
+    args = parser.parse_args()
 
-    print(f"Serving at http://{host}:{port}")
-    HTTPServer((host, port), COOPCOEPHandler).serve_forever()
+    if args.bench:
+        bench(args.host, args.port, args.directory, args.seconds, args.clients)
+    else:
+        daily_path = None if args.no_daily else args.daily_cache
+        server = make_server(args.host, args.port, args.directory, daily_path=daily_path)
+        if daily_path:
+            daily.start_background(daily_path)
+        print(f"Serving at http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        finally:
+            server.RequestHandlerClass.assets.close()
@@ -0,0 +1,113 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+import engine
+import bots
+import tablebase
+import replay
+
+# Usage: python -m scoundrel simulate --games 100000 --difficulty normal --policy greedy --out runs.csv
+
+FIELDS = [
+	"seed", "won", "rooms", "highest_damage", "highest_heal",
+	"highest_weapon", "highest_card_killed"
+]
+
+def play_seed(seed, difficulty, policy, table=None, record=False):
+	# With record, the row ends with the game's replay log
+	game = engine.Game(seed, difficulty)
+	bots.play(game, bots.policies[policy](engine.splitmix64(seed), table))
+	row = (
+		seed, game.status == "won", game.current_room, game.highest_damage,
+		game.highest_heal, game.highest_weapon, game.highest_card_killed
+	)
+	if record:
+		return row + (replay.Replay.from_game(game).to_bytes(),)
+	return row
+
+def play_chunk(chunk):
+	# Workers map the tablebase themselves, so they all share its pages
+	master, start, count, difficulty, policy, table_path, record = chunk
+	table = tablebase.load(table_path) if table_path else None
+	return [play_seed(seed, difficulty, policy, table, record) for seed in engine.seed_stream(master, count, start)]
+
+def chunks(games, master, difficulty, policy, chunk_size, table_path=None, record=False):
+	for start in range(0, games, chunk_size):
+		yield master, start, min(chunk_size, games - start), difficulty, policy, table_path, record
+
+def run(games, difficulty="easy", policy="greedy", master=0, jobs=None, chunk_size=2000, table_path=None, record=False):
+	# Game i always plays seed i of the master stream and results come back
+	# in that order, so the output does not depend on jobs or chunk_size
+	work = chunks(games, master, difficulty, policy, chunk_size, table_path, record)
+	if jobs == 1:
+		for chunk in work:
+			yield from play_chunk(chunk)
+		return
+
+	with Pool(jobs) as pool:
+		for results in pool.imap(play_chunk, work):
+			yield from results
+
+def write_csv(rows, out):
+	writer = csv.writer(out)
+	writer.writerow(FIELDS)
+	for row in rows:
+		writer.writerow(row)
+
+def write_jsonl(rows, out):
+	for row in rows:
+		out.write(json.dumps(dict(zip(FIELDS, row))) + "\n")
+
+writers = {"csv": write_csv, "jsonl": write_jsonl}
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="python -m scoundrel simulate", description="Play many games headlessly and write one result per game.")
+	parser.add_argument("--games", type=int, default=10000)
+	parser.add_argument("--difficulty", choices=engine.difficulties, default="easy")
+	parser.add_argument("--policy", choices=sorted(bots.policies), default="greedy")
+	parser.add_argument("--seed", type=int, help="master seed of the batch (random if omitted)")
+	parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+	parser.add_argument("--chunk-size", type=int, default=2000, help="games per task sent to a worker")
+	parser.add_argument("--tablebase", help="endgame tablebase file for the policy to use (see tablebase.py)")
+	parser.add_argument("--format", choices=sorted(writers), help="default: from --out's extension, else csv")
+	parser.add_argument("--out", help="output file (default: stdout)")
+	parser.add_argument("--replays", help="also write every game's replay log to this archive (see replay.py)")
+	args = parser.parse_args(argv)
+
+	master = args.seed if args.seed is not None else engine.new_seed()
+	fmt = args.format
+	if fmt is None:
+		fmt = "jsonl" if args.out and args.out.endswith((".jsonl", ".json")) else "csv"
+
+	wins = 0
+	replays = open(args.replays, "wb") if args.replays else None
+	def counted(rows):
+		nonlocal wins
+		for row in rows:
+			wins += row[1]
+			if replays:
+				replay.write_archive([row[-1]], replays)
+				row = row[:-1]
+			yield row
+
+	start = time.perf_counter()
+	rows = counted(run(args.games, args.difficulty, args.policy, master, args.jobs, args.chunk_size, args.tablebase, replays is not None))
+	if args.out:
+		with open(args.out, "w", newline="") as out:
+			writers[fmt](rows, out)
+	else:
+		writers[fmt](rows, sys.stdout)
+	elapsed = time.perf_counter() - start
+	if replays:
+		replays.close()
+
+	print(f"Master seed: {master}", file=sys.stderr)
+	print(f"Games: {args.games}  Wins: {wins} ({wins / max(1, args.games):.2%})", file=sys.stderr)
+	print(f"{args.games / elapsed:.0f} games/s on {args.jobs} jobs", file=sys.stderr)
+
+if __name__ == "__main__":
+	main()
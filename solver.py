@@ -0,0 +1,438 @@
+import argparse
+import itertools
+import math
+import random
+import sys
+import time
+from collections import OrderedDict
+import engine
+import bots
+from engine import card_strength, card_suit, card_is_monster, canonical_card, canonical_bytes, canonical_mask, HEARTS, DIAMONDS
+
+# Decides whether a seed can be won and with how much HP, by trying every
+# card order, weapon use, equip/discard and skip. SeedSolver follows the
+# seed's actual deals; ExpectationSolver treats future deals as random and
+# returns the best achievable win probability instead.
+#
+# Usage: python solver.py --seed 1234 --difficulty normal
+
+class TranspositionTable:
+	# LRU-bounded memo: once full, the least recently used position is evicted
+	def __init__(self, capacity=2_000_000):
+		self.capacity = capacity
+		self.table = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key):
+		value = self.table.get(key)
+		if value is None:
+			self.misses += 1
+			return None
+		self.table.move_to_end(key)
+		self.hits += 1
+		return value
+
+	def put(self, key, value):
+		self.table[key] = value
+		if len(self.table) > self.capacity:
+			self.table.popitem(last=False)
+			self.evictions += 1
+
+	def __len__(self):
+		return len(self.table)
+
+"""
+#############
+### RULES ###
+#############
+"""
+
+# The engine rules on plain values, so positions can be tuples
+
+def needs_choice(card, weapon, last):
+	if card_is_monster[card]:
+		s = card_strength[card]
+		return weapon > 0 and (last >= s or last == 0)
+	return card_suit[card] == DIAMONDS and weapon > 0
+
+def play_card(card, use, hp, weapon, last, heal_used, max_hp):
+	s = card_strength[card]
+	if card_is_monster[card]:
+		if use and weapon > 0 and (last >= s or last == 0):
+			return hp - max(0, s - weapon), weapon, s, heal_used
+		return hp - s, weapon, last, heal_used
+	if card_suit[card] == HEARTS:
+		if heal_used:
+			return hp, weapon, last, True
+		return min(max_hp, hp + s), weapon, last, True
+	# Diamonds
+	if weapon > 0 and not use:
+		return hp, weapon, last, heal_used
+	return hp, s, 0 if weapon > 0 else last, heal_used
+
+def card_actions(room, weapon, last):
+	for i, card in enumerate(room):
+		yield i, True
+		if needs_choice(card, weapon, last):
+			yield i, False
+
+"""
+#################
+### SEED MODE ###
+#################
+"""
+
+def heal_value(card):
+	return card_strength[card] if card_suit[card] == HEARTS else 0
+
+def move_order(room, weapon, last, heal_used):
+	# Heals first, then weapon upgrades, then monsters the weapon kills
+	# (strongest first), then everything else by damage taken
+	def score(move):
+		card = room[move[0]]
+		s = card_strength[card]
+		if card_suit[card] == HEARTS:
+			return -100 if not heal_used else 50
+		if card_suit[card] == DIAMONDS:
+			return -50 if (s > weapon) == move[1] else 40
+		if move[1] and weapon > 0 and (last >= s or last == 0):
+			return -s
+		return s
+	return score
+
+class SeedSolver:
+	# Positions are (rng_id, deck, room, hp, weapon, last, heal_used,
+	# skipped_last, played_first_card, heal_left). Deals depend on the RNG
+	# state, so every distinct sequence of draws gets an rng_id and the RNG
+	# state after it is kept; replaying a draw is then a dict lookup.
+	#
+	# The search answers "can this position still win with at least `target`
+	# HP?" and solve() raises the target until the answer is no. A position
+	# can never end above hp plus the hearts still to come, and an answer
+	# carries over to every position it dominates (see strength()).
+	def __init__(self, seed, difficulty="easy", max_hp=20, capacity=2_000_000, tablebase=None):
+		game = engine.Game(seed, difficulty, max_hp)
+		self.tablebase = tablebase
+		self.seed = seed
+		self.difficulty = difficulty
+		self.max_hp = max_hp
+		self.rng = random.Random()
+		self.rng_states = [game.rng.getstate()]
+		self.draws = {}
+		self.table = TranspositionTable(capacity)
+		self.cards_left = TranspositionTable(capacity)
+		self.nodes = 0
+		self.best = None
+		deck = tuple(game.room.deck)
+		room = tuple(game.room.card_seq)
+		heal_left = sum(heal_value(c) for c in deck + room)
+		self.root = (0, deck, room, max_hp, 0, 0, False, False, False, heal_left)
+
+	def draw(self, rng_id, deck, amount):
+		key = (rng_id, len(deck), amount)
+		hit = self.draws.get(key)
+		if hit is None:
+			self.rng.setstate(self.rng_states[rng_id])
+			picks = self.rng.sample(range(len(deck)), k=amount)
+			self.rng_states.append(self.rng.getstate())
+			hit = self.draws[key] = (picks, len(self.rng_states) - 1)
+		picks, rng_id = hit
+		cards = tuple(deck[i] for i in picks)
+		deck = list(deck)
+		for i in sorted(picks, reverse=True):
+			del deck[i]
+		return rng_id, tuple(deck), cards
+
+	def children(self, position):
+		rng_id, deck, room, hp, weapon, last, heal_used, skipped_last, played_first, heal_left = position
+		if deck and not skipped_last and not played_first:
+			deck_back = deck + room
+			r, d, cards = self.draw(rng_id, deck_back, min(4, len(deck_back)))
+			yield engine.SKIP, self.advance(r, d, cards, hp, weapon, last, heal_used, True, False, heal_left)
+		moves = sorted(card_actions(room, weapon, last), key=move_order(room, weapon, last, heal_used))
+		for i, use in moves:
+			card = room[i]
+			h, w, l, healed = play_card(card, use, hp, weapon, last, heal_used, self.max_hp)
+			yield engine.pick(i, use), self.advance(rng_id, deck, room[:i] + room[i + 1:], h, w, l, healed, skipped_last, True, heal_left - heal_value(card))
+
+	def advance(self, rng_id, deck, room, hp, weapon, last, heal_used, skipped_last, played_first, heal_left):
+		if len(room) < 2:
+			if deck:
+				rng_id, deck, cards = self.draw(rng_id, deck, min(3, len(deck)))
+				room = room + cards
+			heal_used = skipped_last = played_first = False
+		return (rng_id, deck, room, hp, weapon, last, heal_used, skipped_last, played_first, heal_left)
+
+	def key(self, position):
+		# The room's order only matters for a skip, and then it is fixed by the
+		# deal, so the sorted room is enough. Deals pick deck positions, so the
+		# deck keeps its order but clubs and spades are folded together.
+		rng_id, deck, room = position[:3]
+		return (bytes(deck).translate(canonical_bytes), bytes(sorted(canonical_card[c] for c in room)), rng_id)
+
+	def least_damage(self, key, weapon):
+		# Damage no line can avoid: every monster stronger than the best weapon
+		# still available hits for at least the difference
+		cards = self.cards_left.get(key[:2])
+		if cards is None:
+			cards = (
+				max([card_strength[c] for c in key[0] + key[1] if card_suit[c] == DIAMONDS] or [0]),
+				[card_strength[c] for c in key[0] + key[1] if card_is_monster[c]]
+			)
+			self.cards_left.put(key[:2], cards)
+		best_weapon = max(weapon, cards[0])
+		return sum(s - best_weapon for s in cards[1] if s > best_weapon)
+
+	def strength(self, position):
+		# Larger is better in every component: HP, weapon, how strong a monster
+		# the weapon can still kill (15 when unrestricted), and the flags that
+		# only take options away when set
+		hp, weapon, last, heal_used, skipped_last, played_first = position[3:9]
+		return (hp, weapon, last or 15, not heal_used, not skipped_last, not played_first)
+
+	def reach(self, position, target):
+		# HP left by some won line that ends with at least `target` HP, or 0
+		hp = position[3]
+		if hp <= 0:
+			return 0
+		if not position[1] and not position[2]:
+			return hp if hp >= target else 0
+		if min(self.max_hp, hp + position[9]) < target:
+			return 0
+
+		if not position[1] and self.tablebase:
+			# Only tells won from lost, so it prunes but can't give the HP left
+			need = self.tablebase.min_hp(position[2], position[4], position[5], position[6])
+			if need is not None and not 0 < need <= hp:
+				return 0
+		key = self.key(position)
+		if hp + position[9] - self.least_damage(key, position[4]) < target:
+			return 0
+		strength = self.strength(position)
+		# Entries are (strength, target, hp): won entries have hp > 0 and apply
+		# to stronger positions, lost ones apply to weaker positions and targets
+		# at least as high
+		entries = self.table.get(key) or []
+		for s, t, v in entries:
+			if v:
+				if v >= target and all(a >= b for a, b in zip(strength, s)):
+					return v
+			elif target >= t and all(a <= b for a, b in zip(strength, s)):
+				return 0
+
+		self.nodes += 1
+		found = 0
+		for _, child in self.children(position):
+			found = self.reach(child, target)
+			if found:
+				break
+		# Keep only entries the new one doesn't already cover
+		if found:
+			entries = [e for e in self.table.get(key) or () if not (e[2] and e[2] <= found and all(a <= b for a, b in zip(strength, e[0])))]
+		else:
+			entries = [e for e in self.table.get(key) or () if e[2] or e[1] < target or not all(a >= b for a, b in zip(strength, e[0]))]
+		entries.append((strength, target, found))
+		self.table.put(key, entries)
+		return found
+
+	def solve(self):
+		# Best HP left at the end of a won run, 0 if the seed can't be won.
+		# Binary search on the target between a line we have and the bound.
+		if self.best is None:
+			best = self.reach(self.root, 1)
+			high = min(self.max_hp, self.root[3] + self.root[9])
+			while best and best < high:
+				target = (best + high + 1) // 2
+				found = self.reach(self.root, target)
+				if found:
+					best = found
+				else:
+					high = target - 1
+			self.best = best
+		return self.best
+
+	def best_line(self):
+		# Actions reaching the best result, from the start of the run
+		line = []
+		target = self.solve()
+		position = self.root
+		if target == 0:
+			return line
+		while position[1] or position[2]:
+			for action, child in self.children(position):
+				if self.reach(child, target):
+					line.append(action)
+					position = child
+					break
+		return line
+
+"""
+########################
+### EXPECTATION MODE ###
+########################
+"""
+
+class ExpectationSolver:
+	# Positions are (deck_mask, room_mask, hp, weapon, last, heal_used,
+	# skipped_last, played_first_card) and every deal is a chance node over
+	# the remaining cards. Deals that differ only by clubs <-> spades are
+	# solved once through one representative and weighted, and a room holding
+	# both suits of a rank only tries one of them, so the search never builds
+	# two positions that are mirror images of each other. Chance nodes with more than max_branches outcomes
+	# are estimated from `samples` random deals, which keeps early positions
+	# tractable at the cost of exactness.
+	def __init__(self, max_hp=20, max_branches=2000, samples=64, seed=None, capacity=2_000_000, tablebase=None):
+		self.max_hp = max_hp
+		self.tablebase = tablebase
+		self.max_branches = max_branches
+		self.samples = samples
+		self.rng = random.Random(seed)
+		self.table = TranspositionTable(capacity)
+		self.cards = TranspositionTable(capacity)
+		self.deal_table = TranspositionTable(capacity)
+		self.nodes = 0
+
+	def position(self, game):
+		room = game.room
+		player = game.player
+		return (
+			room.deck_mask, engine.cards_mask(room.card_seq), player.hp,
+			player.current_weapon, player.last_card_killed, room.heal_used,
+			room.skipped_last, room.played_first_card
+		)
+
+	def deals(self, deck_mask, amount):
+		# (dealt mask, weight) for each distinct deal up to clubs <-> spades
+		cards = [c for c in range(len(engine.deck_names)) if deck_mask >> c & 1]
+		amount = min(amount, len(cards))
+		if math.comb(len(cards), amount) > self.max_branches:
+			return [(engine.cards_mask(self.rng.sample(cards, amount)), 1) for _ in range(self.samples)]
+		hit = self.deal_table.get((deck_mask, amount))
+		if hit is not None:
+			return hit
+		deals = {}
+		for dealt in itertools.combinations(cards, amount):
+			dealt = engine.cards_mask(dealt)
+			key = canonical_mask(dealt)
+			if key in deals:
+				deals[key][1] += 1
+			else:
+				deals[key] = [dealt, 1]
+		deals = list(deals.values())
+		self.deal_table.put((deck_mask, amount), deals)
+		return deals
+
+	def chance(self, deck_mask, room_mask, amount, hp, weapon, last, heal_used, skipped_last, played_first):
+		total = 0.0
+		count = 0
+		for dealt, weight in self.deals(deck_mask, amount):
+			total += weight * self.value((deck_mask ^ dealt, room_mask | dealt, hp, weapon, last, heal_used, skipped_last, played_first))
+			count += weight
+		return total / count
+
+	def after(self, deck_mask, room_mask, hp, weapon, last, heal_used, skipped_last, played_first):
+		if hp <= 0:
+			return 0.0
+		if room_mask & (room_mask - 1) == 0:
+			if deck_mask:
+				return self.chance(deck_mask, room_mask, 3, hp, weapon, last, False, False, False)
+			if not room_mask:
+				return 1.0
+			heal_used = skipped_last = played_first = False
+		return self.value((deck_mask, room_mask, hp, weapon, last, heal_used, skipped_last, played_first))
+
+	def cards_left(self, mask):
+		# (hearts total, best diamond, monster strengths) of the cards in mask
+		cards = self.cards.get(mask)
+		if cards is None:
+			ids = [c for c in range(len(engine.deck_names)) if mask >> c & 1]
+			cards = (
+				sum(heal_value(c) for c in ids),
+				max([card_strength[c] for c in ids if card_suit[c] == DIAMONDS] or [0]),
+				[card_strength[c] for c in ids if card_is_monster[c]]
+			)
+			self.cards.put(mask, cards)
+		return cards
+
+	def value(self, position):
+		# Best win probability from this position
+		best = self.table.get(position)
+		if best is not None:
+			return best
+
+		self.nodes += 1
+		deck_mask, room_mask, hp, weapon, last, heal_used, skipped_last, played_first = position
+		heals, diamond, monsters = self.cards_left(deck_mask | room_mask)
+		best_weapon = max(weapon, diamond)
+		if hp + heals <= sum(s - best_weapon for s in monsters if s > best_weapon):
+			self.table.put(position, 0.0)
+			return 0.0
+		room = [c for c in range(len(engine.deck_names)) if room_mask >> c & 1]
+		if not deck_mask and self.tablebase:
+			need = self.tablebase.min_hp(room, weapon, last, heal_used)
+			if need is not None:
+				best = 1.0 if 0 < need <= hp else 0.0
+				self.table.put(position, best)
+				return best
+		best = 0.0
+		if deck_mask and not skipped_last and not played_first:
+			best = self.chance(deck_mask | room_mask, 0, 4, hp, weapon, last, heal_used, True, False)
+		seen = set()
+		for i, use in card_actions(room, weapon, last):
+			if (canonical_card[room[i]], use) in seen:
+				continue
+			seen.add((canonical_card[room[i]], use))
+			h, w, l, healed = play_card(room[i], use, hp, weapon, last, heal_used, self.max_hp)
+			best = max(best, self.after(deck_mask, room_mask ^ (1 << room[i]), h, w, l, healed, skipped_last, True))
+			if best == 1.0:
+				break
+		self.table.put(position, best)
+		return best
+
+	def solve(self, game):
+		return self.value(self.position(game))
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Decide whether a seed can be won.")
+	parser.add_argument("--seed", type=int, required=True)
+	parser.add_argument("--difficulty", choices=engine.difficulties, default="easy")
+	parser.add_argument("--capacity", type=int, default=2_000_000, help="transposition table size")
+	parser.add_argument("--expect", action="store_true", help="treat future deals as random and report the best win probability")
+	parser.add_argument("--tablebase", help="endgame tablebase file (see tablebase.py)")
+	parser.add_argument("--cards-left", type=int, default=7, help="in --expect mode, play the seed's best line (or greedy) until this many cards are left in the deck")
+	args = parser.parse_args(argv)
+
+	table = None
+	if args.tablebase:
+		import tablebase  # imports this module
+		table = tablebase.load(args.tablebase)
+
+	sys.setrecursionlimit(10000)
+	start = time.perf_counter()
+	solver = SeedSolver(args.seed, args.difficulty, capacity=args.capacity, tablebase=table)
+	hp = solver.solve()
+	print(f"Winnable: {'yes' if hp else 'no'}")
+	if hp:
+		print(f"Max HP left: {hp}")
+		print("Line: " + " ".join(str(a) for a in solver.best_line()))
+	print(f"{solver.nodes} positions in {time.perf_counter() - start:.2f}s, table {len(solver.table)} (hits {solver.table.hits}, evictions {solver.table.evictions})")
+
+	if args.expect:
+		game = engine.Game(args.seed, args.difficulty)
+		line = iter(solver.best_line())
+		policy = bots.GreedyPolicy(args.seed)
+		while not game.over and len(game.room.deck) > args.cards_left:
+			game.step(next(line) if hp else policy.choose(game))
+		if game.over:
+			print("The game ends before that many cards are left")
+			return
+		start = time.perf_counter()
+		expect = ExpectationSolver(seed=args.seed, capacity=args.capacity, tablebase=table)
+		p = expect.solve(game)
+		print(f"With {len(game.room.deck)} cards left and {game.player.hp} HP, best win probability: {p:.3f}")
+		print(f"{expect.nodes} positions in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+	main()
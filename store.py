@@ -0,0 +1,215 @@
+import atexit
+import os
+import time
+
+try:
+	import threading
+except ImportError:
+	threading = None
+
+# Key=value files (game_configs.txt, scoundrel_saves.txt) kept in memory and
+# written behind. Setting a value only marks the store dirty; the file is
+# rewritten once `delay` seconds later with everything set meanwhile, so an
+# endless run that updates its high score every room costs one write every
+# couple of seconds instead of one per room. Each write goes to a temporary
+# file that is fsync'd and then renamed over the old one, so a crash leaves
+# either the old file or the new one, never half of one.
+#
+# The delayed write runs on a timer thread. Where there are no threads (the
+# browser) tick() does it instead, and the game loop calls tick_all() every
+# turn.
+# Everything dirty is flushed at exit.
+#
+# The file is read the first time a value is needed.
+#
+# Usage: python store.py --rooms 20000
+
+DELAY = 2.0
+
+stores = []
+
+def flush_all():
+	for store in stores:
+		store.flush()
+
+def tick_all():
+	for store in stores:
+		store.tick()
+
+atexit.register(flush_all)
+
+class Store:
+	def __init__(self, path, defaults, parse=str, format=str, delay=DELAY):
+		# parse/format convert a value from/to its text in the file
+		self.path = path
+		self.data = dict(defaults)
+		self.parse = parse
+		self.format = format
+		self.delay = delay
+		self.loaded = False
+		self.dirty = False
+		self.due = None  # when the pending write is due
+		self.timer = None
+		self.writes = 0
+		if threading:
+			self.lock = threading.Lock()  # data and dirty
+			self.write_lock = threading.Lock()  # the file
+		stores.append(self)
+
+	def load(self):
+		self.loaded = True
+		if not os.path.exists(self.path):
+			# Written out with the defaults, as before
+			self.mark()
+			return
+		with open(self.path) as f:
+			for line in f:
+				if "=" in line:
+					key, value = line.strip().split("=", 1)
+					if key in self.data:
+						self.data[key] = self.parse(value)
+
+	def __getitem__(self, key):
+		if not self.loaded:
+			self.load()
+		return self.data[key]
+
+	def __setitem__(self, key, value):
+		if not self.loaded:
+			self.load()
+		if threading:
+			with self.lock:
+				self.data[key] = value
+		else:
+			self.data[key] = value
+		self.mark()
+
+	def items(self):
+		if not self.loaded:
+			self.load()
+		return self.data.items()
+
+	def mark(self):
+		if self.dirty:
+			return
+		self.dirty = True
+		self.due = time.monotonic() + self.delay
+		if threading and self.timer is None:
+			try:
+				self.timer = threading.Timer(self.delay, self.flush)
+				self.timer.daemon = True
+				self.timer.start()
+			except RuntimeError:  # no threads after all (Pyodide)
+				self.timer = None
+
+	def tick(self):
+		# Writes if a write is due; for when there's no timer thread
+		if self.dirty and time.monotonic() >= self.due:
+			self.flush()
+
+	def flush(self):
+		if threading:
+			with self.write_lock:
+				with self.lock:
+					lines = self.take()
+				if lines is not None:
+					self.write(lines)
+		else:
+			lines = self.take()
+			if lines is not None:
+				self.write(lines)
+
+	def take(self):
+		# The file's new text, or None if nothing changed
+		self.timer = None
+		if not self.dirty:
+			return None
+		self.dirty = False
+		return "".join(f"{k}={self.format(v)}\n" for k, v in self.data.items())
+
+	def write(self, text):
+		temp = f"{self.path}.{os.getpid()}.tmp"
+		with open(temp, "w") as f:
+			f.write(text)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(temp, self.path)
+		self.writes += 1
+
+def parse_bool(value):
+	return value.lower() == "true"
+
+def format_bool(value):
+	return "true" if value else "false"
+
+def parse_number(value):
+	# Numbers where they are, anything else kept as text
+	try:
+		return int(value)
+	except ValueError:
+		return value
+
+"""
+#################
+### BENCHMARK ###
+#################
+"""
+
+def rewrite(path, saves):
+	# What the game did before on every room: rewrite the file in place
+	with open(path, "w") as f:
+		for k, v in saves.items():
+			f.write(f"{k}={v}\n")
+
+def bench(rooms, delay):
+	# A long endless run on one seed, recording the high score every room
+	# both ways
+	import tempfile
+	import engine
+	import bots
+
+	def run(record):
+		game = engine.Game(1, "easy")
+		game.can_die = False
+		policy = bots.GreedyPolicy(1)
+		start = time.perf_counter()
+		while game.current_room <= rooms:
+			if game.status == "won":
+				game.step(engine.ENDLESS)
+			for event in game.step(policy.choose(game)):
+				if event[0] == "room" and game.endless_mode:
+					record(event[1])
+		return time.perf_counter() - start
+
+	defaults = {"easy_high_score": 0, "normal_high_score": 0}
+	with tempfile.TemporaryDirectory() as tmp:
+		path = os.path.join(tmp, "scoundrel_saves.txt")
+		saves = dict(defaults)
+		def record(room):
+			saves["easy_high_score"] = room
+			rewrite(path, saves)
+		before = run(record)
+
+		store = Store(path, defaults, parse_number, delay=delay)
+		def record(room):
+			store["easy_high_score"] = room
+			store.tick()
+		after = run(record)
+		store.flush()
+		with open(path) as f:
+			saved = f.read().split()
+
+	print(f"{rooms} rooms, {saved[0]}")
+	print(f"rewrite every room: {rooms / before:9.0f} rooms/s")
+	print(f"write-behind store: {rooms / after:9.0f} rooms/s, {store.writes} fsync'd writes ({delay}s delay)")
+
+def main(argv=None):
+	import argparse
+	parser = argparse.ArgumentParser(description="Time long endless runs saving the high score every room.")
+	parser.add_argument("--rooms", type=int, default=20000)
+	parser.add_argument("--delay", type=float, default=DELAY, help="seconds a write waits to gather more changes")
+	args = parser.parse_args(argv)
+	bench(args.rooms, args.delay)
+
+if __name__ == "__main__":
+	main()
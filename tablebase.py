@@ -0,0 +1,270 @@
+import argparse
+import itertools
+import math
+import mmap
+import random
+import struct
+import time
+import engine
+from engine import card_strength, card_suit, card_is_monster, HEARTS, DIAMONDS
+from solver import play_card, card_actions
+
+# Endgame tablebase: for every room of at most N cards with the deck empty,
+# the least HP that still wins from it (0 if nothing does). With 4 or fewer
+# cards left every deal is forced, so these positions have an exact answer
+# and a position with a non-empty deck reaches one within a move or two.
+#
+# The table is one flat file of bytes indexed by (card set, weapon, last
+# card killed, heal used). It is opened with mmap, so a probe reads one
+# byte and processes that open the same file share its pages.
+#
+# Generating needs numpy; probing doesn't.
+#
+# Usage: python tablebase.py --difficulty normal --out endgame-normal.tb
+
+MAGIC = b"SCTB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBB")  # magic, version, difficulty, cards, max_hp
+MAX_CARDS = engine.MAX_ROOM_CARDS
+LASTS = 14  # last card killed: 0 (none) or 2 - 14
+
+def last_index(last):
+	return last - 1 if last else 0
+
+def weapons(difficulty):
+	# Weapon values a position can hold: none or any diamond of the deck
+	deck = engine.difficulty_decks[difficulty]
+	return [0] + sorted(card_strength[c] for c in deck if card_suit[c] == DIAMONDS)
+
+class Layout:
+	# Card sets of k cards are ranked with the combinatorial number system over
+	# the difficulty's deck, after all sets of fewer cards
+	def __init__(self, difficulty, cards):
+		self.difficulty = difficulty
+		self.cards = cards
+		self.deck = engine.difficulty_decks[difficulty]
+		self.position = {c: i for i, c in enumerate(self.deck)}
+		self.weapons = weapons(difficulty)
+		self.weapon_index = {w: i for i, w in enumerate(self.weapons)}
+		self.binom = [[math.comb(n, k) for k in range(cards + 1)] for n in range(len(self.deck) + 1)]
+		self.offsets = [0]
+		for k in range(1, cards + 1):
+			self.offsets.append(self.offsets[-1] + self.binom[len(self.deck)][k - 1])
+		self.sets = self.offsets[-1] + self.binom[len(self.deck)][cards]
+		self.stride = len(self.weapons) * LASTS * 2
+
+	def set_index(self, cards):
+		positions = sorted(self.position[c] for c in cards)
+		index = self.offsets[len(positions)]
+		for k, p in enumerate(positions, 1):
+			index += self.binom[p][k]
+		return index
+
+	def entry(self, cards, weapon, last, heal_used):
+		return (
+			self.set_index(cards) * self.stride
+			+ (self.weapon_index[weapon] * LASTS + last_index(last)) * 2 + heal_used
+		)
+
+class Tablebase:
+	def __init__(self, path):
+		with open(path, "rb") as f:
+			self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, version, difficulty, cards, max_hp = HEADER.unpack_from(self.map)
+		if magic != MAGIC or version != VERSION:
+			raise ValueError(f"{path} is not a tablebase")
+		self.path = path
+		self.difficulty = engine.difficulties[difficulty]
+		self.max_hp = max_hp
+		self.layout = Layout(self.difficulty, cards)
+		self.cards = cards
+
+	def min_hp(self, cards, weapon, last, heal_used):
+		# Least HP that wins with these cards left (0: none does), or None
+		# when the position isn't covered
+		if not cards or len(cards) > self.cards:
+			return None
+		layout = self.layout
+		if weapon not in layout.weapon_index or any(c not in layout.position for c in cards):
+			return None
+		return self.map[HEADER.size + layout.entry(cards, weapon, last, heal_used)]
+
+	def probe(self, game):
+		# True/False if the game is won/lost from here with best play, None
+		# when the tablebase doesn't cover it
+		room = game.room
+		player = game.player
+		if room.deck or game.over or game.endless_mode or player.max_hp != self.max_hp or game.difficulty != self.difficulty:
+			return None
+		need = self.min_hp(room.card_seq, player.current_weapon, player.last_card_killed, room.heal_used)
+		if need is None:
+			return None
+		return need > 0 and player.hp >= need
+
+	def best_action(self, game):
+		# An action that keeps a covered, won position won, or None
+		if not self.probe(game):
+			return None
+		player = game.player
+		room = game.room.card_seq
+		for i, use in card_actions(room, player.current_weapon, player.last_card_killed):
+			hp, weapon, last, heal_used = play_card(room[i], use, player.hp, player.current_weapon, player.last_card_killed, game.room.heal_used, player.max_hp)
+			rest = room[:i] + room[i + 1:]
+			if len(rest) < 2:
+				heal_used = False
+			if hp > 0 and (not rest or 0 < self.min_hp(rest, weapon, last, heal_used) <= hp):
+				return engine.pick(i, use)
+		return None
+
+_open = {}
+
+def load(path):
+	# One mapping per file per process
+	tablebase = _open.get(path)
+	if tablebase is None:
+		tablebase = _open[path] = Tablebase(path)
+	return tablebase
+
+"""
+##################
+### GENERATION ###
+##################
+"""
+
+INF = 255
+
+def layer(layout, k, child, max_hp, chunk=20000):
+	# Least winning HP of every k-card set, from the (k-1)-card layer `child`
+	# (None for k = 1, where every child position is already won). Rows are
+	# in rank order, which is not the order combinations() yields them in.
+	import numpy as np
+
+	deck = np.array(layout.deck)
+	binom = np.array(layout.binom, dtype=np.int64)
+	weapon_values = np.array(layout.weapons)
+	weapon_of = np.zeros(15, dtype=np.int64)
+	weapon_of[weapon_values] = np.arange(len(weapon_values))
+	strength = np.array(card_strength)[deck]
+	suit = np.array(card_suit)[deck]
+	monster = np.array(card_is_monster)[deck]
+
+	W = weapon_values[None, :, None, None]
+	w_i = np.arange(len(weapon_values))[None, :, None, None]
+	L = np.array([0] + list(range(2, 15)))[None, None, :, None]
+	l_i = np.arange(LASTS)[None, None, :, None]
+	H = np.arange(2)[None, None, None, :]
+
+	combos = np.array(list(itertools.combinations(range(len(deck)), k)), dtype=np.int64).reshape(-1, k)
+	ranks = sum(binom[combos[:, j], j + 1] for j in range(k))
+	out = np.empty((len(combos), len(weapon_values), LASTS, 2), dtype=np.int16)
+	reset = k - 1 < 2
+
+	for start in range(0, len(combos), chunk):
+		sets = combos[start:start + chunk]
+		need = np.full((len(sets), len(weapon_values), LASTS, 2), INF, dtype=np.int16)
+
+		def lookup(rank, w, l, h):
+			if child is None:
+				return np.ones(np.broadcast_shapes(rank.shape, np.shape(w), np.shape(l), np.shape(h)), dtype=np.int16)
+			return child[rank, w, l, 0 if reset else h]
+
+		for j in range(k):
+			rest = np.delete(sets, j, axis=1)
+			rank = sum(binom[rest[:, i], i + 1] for i in range(k - 1))[:, None, None, None] if k > 1 else np.zeros((len(sets), 1, 1, 1), dtype=np.int64)
+			p = sets[:, j]
+			s = strength[p][:, None, None, None]
+			m = monster[p][:, None, None, None]
+			heart = (suit[p] == HEARTS)[:, None, None, None]
+			diamond = (suit[p] == DIAMONDS)[:, None, None, None]
+
+			# Monster, fought barehanded
+			bare = lookup(rank, w_i, l_i, H) + s
+			need = np.where(m, np.minimum(need, bare), need)
+			# Monster, fought with the weapon
+			usable = (W > 0) & ((L == 0) | (L >= s))
+			armed = lookup(rank, w_i, s - 1, H) + np.maximum(0, s - W)
+			need = np.where(m & usable, np.minimum(need, armed), need)
+			# Heart: heals (capped at max_hp) unless one was already used this room
+			healed = lookup(rank, w_i, l_i, 1)
+			healed = np.where(healed > max_hp, INF, np.maximum(1, healed - s))
+			discarded = lookup(rank, w_i, l_i, H)
+			need = np.where(heart, np.minimum(need, np.where(H == 0, healed, discarded)), need)
+			# Diamond: equip (resets last card killed if a weapon was held) or discard
+			equipped = lookup(rank, weapon_of[s], np.where(W > 0, 0, l_i), H)
+			need = np.where(diamond, np.minimum(need, equipped), need)
+			need = np.where(diamond & (W > 0), np.minimum(need, lookup(rank, w_i, l_i, H)), need)
+
+		out[ranks[start:start + chunk]] = np.where(need > max_hp, INF, need)
+	return out
+
+def generate(path, difficulty="easy", cards=MAX_CARDS, max_hp=20):
+	import numpy as np
+
+	if not 1 <= cards <= MAX_CARDS:
+		raise ValueError(f"cards must be between 1 and {MAX_CARDS}: more than that and deals are random")
+	layout = Layout(difficulty, cards)
+	with open(path, "wb") as f:
+		f.write(HEADER.pack(MAGIC, VERSION, engine.difficulties.index(difficulty), cards, max_hp))
+		f.write(bytes(layout.stride))  # the empty set, never probed
+		child = None
+		for k in range(1, cards + 1):
+			child = layer(layout, k, child, max_hp)
+			f.write(np.where(child == INF, 0, child).astype(np.uint8).tobytes())
+	return layout
+
+"""
+##################
+### VALIDATION ###
+##################
+"""
+
+def brute_min_hp(cards, weapon, last, heal_used, max_hp):
+	# Same answer as the table, by trying every HP and every line
+	def wins(cards, hp, weapon, last, heal_used):
+		if not cards:
+			return True
+		for i, use in card_actions(cards, weapon, last):
+			h, w, l, healed = play_card(cards[i], use, hp, weapon, last, heal_used, max_hp)
+			rest = cards[:i] + cards[i + 1:]
+			if h > 0 and wins(rest, h, w, l, False if len(rest) < 2 else healed):
+				return True
+		return False
+	for hp in range(1, max_hp + 1):
+		if wins(list(cards), hp, weapon, last, heal_used):
+			return hp
+	return 0
+
+def check(tablebase, positions, seed=0):
+	rng = random.Random(seed)
+	layout = tablebase.layout
+	for _ in range(positions):
+		cards = rng.sample(layout.deck, rng.randint(1, tablebase.cards))
+		weapon = rng.choice(layout.weapons)
+		last = rng.choice([0] + list(range(2, 15))) if weapon else 0
+		heal_used = rng.random() < 0.5
+		expected = brute_min_hp(cards, weapon, last, heal_used, tablebase.max_hp)
+		found = tablebase.min_hp(cards, weapon, last, heal_used)
+		if found != expected:
+			names = ", ".join(engine.card_name(c) for c in cards)
+			raise AssertionError(f"[{names}] weapon {weapon} last {last} heal_used {heal_used}: table {found}, search {expected}")
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Build an endgame tablebase.")
+	parser.add_argument("--difficulty", choices=engine.difficulties, default="easy")
+	parser.add_argument("--cards", type=int, default=MAX_CARDS, help="largest room covered (at most 4)")
+	parser.add_argument("--out", help="default: endgame-<difficulty>.tb")
+	parser.add_argument("--check", type=int, default=0, metavar="N", help="compare N random positions against a direct search")
+	args = parser.parse_args(argv)
+
+	path = args.out or f"endgame-{args.difficulty}.tb"
+	start = time.perf_counter()
+	layout = generate(path, args.difficulty, args.cards)
+	print(f"{layout.sets} card sets, {HEADER.size + layout.sets * layout.stride} bytes written to {path} in {time.perf_counter() - start:.1f}s")
+
+	if args.check:
+		start = time.perf_counter()
+		check(load(path), args.check)
+		print(f"{args.check} positions match a direct search ({time.perf_counter() - start:.1f}s)")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool
+import numpy as np
+import engine
+import batch_sim
+import env
+
+# Streams (state, action, reward, next state) transitions from batch_sim
+# games into chunked .npy files, and reads them back memory-mapped. Needs
+# numpy, like batch_sim.py.
+#
+# An export is a directory of chunks, each a subdirectory with one .npy file
+# per column preallocated for chunk_size rows, plus meta.json listing the
+# chunks in order with how many rows each holds. Writers copy whole arrays
+# (one row per game per step) into the open chunk, so nothing per step or
+# per game is a Python object. States are stored compactly and turned into
+# env.py observations only when read:
+#
+#   room          (4,) card ids, -1 for empty slots
+#   hp, weapon, last
+#   flags         heal used | skipped last << 1 | played first card << 2
+#   deck          (7,) the 52 deck bits, packed little-endian
+#   action, reward, done, episode
+#   next_*        the state columns after the action
+#
+# Usage: python trajectories.py export --transitions 10000000 --out runs.traj
+#        python trajectories.py read runs.traj
+
+STATE = [
+	("room", np.int8, (engine.MAX_ROOM_CARDS,)), ("hp", np.int16, ()),
+	("weapon", np.int8, ()), ("last", np.int8, ()), ("flags", np.uint8, ()),
+	("deck", np.uint8, ((batch_sim.NCARDS + 7) // 8,))
+]
+COLUMNS = (
+	STATE + [("action", np.int8, ()), ("reward", np.int8, ()), ("done", bool, ()), ("episode", np.int64, ())]
+	+ [("next_" + name, dtype, shape) for name, dtype, shape in STATE]
+)
+
+def state(batch, prefix=""):
+	# Copies: BatchGame.step changes its arrays in place
+	return {
+		prefix + "room": batch.room.copy(), prefix + "hp": batch.hp.copy(),
+		prefix + "weapon": batch.current_weapon.copy(), prefix + "last": batch.last_card_killed.copy(),
+		prefix + "flags": batch.heal_used | batch.skipped_last << 1 | batch.played_first_card << 2,
+		prefix + "deck": np.packbits(batch.deck, axis=1, bitorder="little")
+	}
+
+class TrajectoryWriter:
+	def __init__(self, path, prefix="chunk", chunk_size=1 << 20):
+		self.path = path
+		self.prefix = prefix
+		self.chunk_size = chunk_size
+		self.chunks = []  # [name, rows] of every chunk written so far
+		self.files = None
+		os.makedirs(path, exist_ok=True)
+
+	def open_chunk(self):
+		name = f"{self.prefix}-{len(self.chunks):05}"
+		os.makedirs(os.path.join(self.path, name), exist_ok=True)
+		self.files = {
+			column: np.lib.format.open_memmap(
+				os.path.join(self.path, name, column + ".npy"), mode="w+",
+				dtype=dtype, shape=(self.chunk_size,) + shape
+			)
+			for column, dtype, shape in COLUMNS
+		}
+		self.chunks.append([name, 0])
+
+	def append(self, columns):
+		# columns maps every column to an array with one row per transition
+		n = len(columns["action"])
+		at = 0
+		while at < n:
+			if self.files is None or self.chunks[-1][1] == self.chunk_size:
+				self.close_chunk()
+				self.open_chunk()
+			rows = self.chunks[-1][1]
+			take = min(n - at, self.chunk_size - rows)
+			for column, data in self.files.items():
+				data[rows:rows + take] = columns[column][at:at + take]
+			self.chunks[-1][1] += take
+			at += take
+
+	def close_chunk(self):
+		if self.files:
+			for data in self.files.values():
+				data.flush()
+			self.files = None
+
+	def close(self):
+		self.close_chunk()
+		return self.chunks
+
+def record(batch, policy, transitions, writer, episode_base=0):
+	# Steps every game in batch, restarting finished ones, until `transitions`
+	# rows are written. Episode ids are episode_base plus a running count.
+	choose = batch_sim.batch_policies[policy]
+	episodes = episode_base + np.arange(batch.games)
+	next_episode = episode_base + batch.games
+	written = 0
+	while written < transitions:
+		before = state(batch)
+		actions = choose(batch)
+		batch.step(actions)
+		done = ~batch.active
+		columns = dict(before, **state(batch, "next_"))
+		columns.update(action=actions, reward=env.reward(batch.status), done=done, episode=episodes)
+		take = min(batch.games, transitions - written)
+		writer.append({name: data[:take] for name, data in columns.items()})
+		written += take
+
+		finished = np.flatnonzero(done)
+		batch.reset(finished)
+		episodes = episodes.copy()
+		episodes[finished] = next_episode + np.arange(len(finished))
+		next_episode += len(finished)
+	return written
+
+def export_part(part):
+	path, index, transitions, envs, difficulty, policy, seed, max_hp, chunk_size = part
+	writer = TrajectoryWriter(path, f"part{index:03}", chunk_size)
+	batch = batch_sim.BatchGame(envs, difficulty, seed, max_hp)
+	record(batch, policy, transitions, writer, index << 40)
+	return writer.close()
+
+def export(path, transitions, envs=4096, difficulty="easy", policy="greedy", master=0, jobs=None, chunk_size=1 << 20, max_hp=20):
+	# Each job records its share into its own chunks; meta.json lists them all
+	jobs = jobs or os.cpu_count()
+	share = -(-transitions // jobs)
+	parts = [
+		(path, i, min(share, transitions - i * share), envs, difficulty, policy, engine.derive_seed(master, i), max_hp, chunk_size)
+		for i in range(jobs) if i * share < transitions
+	]
+	if jobs == 1:
+		chunks = [export_part(p) for p in parts]
+	else:
+		with Pool(jobs) as pool:
+			chunks = pool.map(export_part, parts)
+	with open(os.path.join(path, "meta.json"), "w") as f:
+		json.dump({
+			"difficulty": difficulty, "policy": policy, "master": master, "max_hp": max_hp,
+			"chunks": [c for part in chunks for c in part],
+			"columns": {name: [np.dtype(dtype).str, list(shape)] for name, dtype, shape in COLUMNS}
+		}, f, indent=1)
+
+class Trajectories:
+	# Read side: chunks open memory-mapped, and a slice only reads the
+	# chunks it overlaps
+	def __init__(self, path):
+		with open(os.path.join(path, "meta.json")) as f:
+			self.meta = json.load(f)
+		self.path = path
+		self.chunks = [(name, rows) for name, rows in self.meta["chunks"] if rows]
+		self.offsets = np.cumsum([0] + [rows for _, rows in self.chunks])
+		self.maps = {}
+
+	def __len__(self):
+		return int(self.offsets[-1])
+
+	def chunk(self, i, column):
+		key = (i, column)
+		if key not in self.maps:
+			name, rows = self.chunks[i]
+			self.maps[key] = np.load(os.path.join(self.path, name, column + ".npy"), mmap_mode="r")[:rows]
+		return self.maps[key]
+
+	def column(self, name, start=0, stop=None):
+		stop = len(self) if stop is None else min(stop, len(self))
+		first = max(0, np.searchsorted(self.offsets, start, "right") - 1)
+		parts = []
+		i = first
+		while i < len(self.chunks) and self.offsets[i] < stop:
+			lo = max(start, self.offsets[i]) - self.offsets[i]
+			hi = min(stop, self.offsets[i + 1]) - self.offsets[i]
+			parts.append(self.chunk(i, name)[lo:hi])
+			i += 1
+		return parts[0] if len(parts) == 1 else np.concatenate(parts) if parts else np.empty(0)
+
+	def observations(self, start=0, stop=None, next=False):
+		# env.py observations for rows start:stop
+		prefix = "next_" if next else ""
+		get = lambda name: self.column(prefix + name, start, stop)
+		flags = get("flags")
+		deck = np.unpackbits(get("deck"), axis=1, count=batch_sim.NCARDS, bitorder="little")
+		return env.encode(
+			get("room").astype(np.int16), get("hp"), get("weapon"), get("last"),
+			flags & 1, flags >> 1 & 1, flags >> 2 & 1, deck.astype(np.float32),
+			self.meta["max_hp"]
+		)
+
+	def iter_chunks(self, name):
+		for i in range(len(self.chunks)):
+			yield self.chunk(i, name)
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Export batch_sim transitions to chunked .npy files, or read an export back.")
+	sub = parser.add_subparsers(dest="command", required=True)
+	out = sub.add_parser("export")
+	out.add_argument("--out", required=True, help="export directory")
+	out.add_argument("--transitions", type=int, default=10_000_000)
+	out.add_argument("--envs", type=int, default=4096, help="games stepped together per job")
+	out.add_argument("--difficulty", choices=engine.difficulties, default="easy")
+	out.add_argument("--policy", choices=sorted(batch_sim.batch_policies), default="greedy")
+	out.add_argument("--seed", type=int)
+	out.add_argument("--jobs", type=int, default=os.cpu_count())
+	out.add_argument("--chunk-size", type=int, default=1 << 20, help="rows per chunk file")
+	read = sub.add_parser("read")
+	read.add_argument("export")
+	args = parser.parse_args(argv)
+
+	if args.command == "export":
+		master = args.seed if args.seed is not None else engine.new_seed()
+		start = time.perf_counter()
+		export(args.out, args.transitions, args.envs, args.difficulty, args.policy, master, args.jobs, args.chunk_size)
+		elapsed = time.perf_counter() - start
+		print(f"{args.transitions} transitions in {elapsed:.1f}s ({args.transitions / elapsed:.0f}/s on {args.jobs} jobs)")
+		return
+
+	data = Trajectories(args.export)
+	start = time.perf_counter()
+	episodes = wins = 0
+	for done, reward in zip(data.iter_chunks("done"), data.iter_chunks("reward")):
+		episodes += int(done.sum())
+		wins += int((reward > 0).sum())
+	elapsed = time.perf_counter() - start
+	print(f"{len(data)} transitions in {len(data.chunks)} chunks, {episodes} episodes ended, {wins} won")
+	print(f"Scanned done and reward at {len(data) / max(elapsed, 1e-9):.0f} transitions/s")
+	sample = data.observations(len(data) // 2, len(data) // 2 + 4)
+	print(f"Observations: {sample.shape[1]} floats each, e.g. hp {sample[:, engine.MAX_ROOM_CARDS * env.SLOT_FEATURES]}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,258 @@
+import argparse
+import os
+import queue
+import random
+import sys
+import time
+from multiprocessing import Pool
+import engine
+import bots
+import replay
+import solver
+
+# Checks submitted high scores by replaying them. A submission is a player
+# name, the claimed endless score and the run's replay log; the score only
+# counts if the log replays legally, without cheats or undos, to that score. Nothing
+# the client saved (saves, /set, /exec) is trusted, only the seed and the
+# actions.
+#
+# Usage: python verify.py --demo 20000
+
+CHEATS = {engine.TOGGLE_CAN_DIE, engine.TOGGLE_INFINITE_SKIPS}
+DECLINES = {engine.pick(i, False) for i in range(4)}  # fight barehanded, discard a weapon
+
+class Submission:
+	def __init__(self, player, score, log):
+		self.player = player
+		self.score = score
+		self.log = log
+
+class Result:
+	def __init__(self, player, difficulty, score, reason=None):
+		self.player = player
+		self.difficulty = difficulty
+		self.score = score
+		self.reason = reason  # None when verified
+
+	@property
+	def verified(self):
+		return self.reason is None
+
+def endless_score(run):
+	# The score the game saves: the last room cleared in endless mode
+	game = engine.Game(run.seed, run.difficulty, run.max_hp)
+	step = game.step
+	score = 0
+	needs_choice = game.needs_choice
+	for action in run.actions:
+		# step() checks everything else, but also takes declining a card that
+		# offers no choice, as the same move, which legal_actions() never offers
+		if action in DECLINES:
+			index = action // 2 - 1
+			if index >= len(game.room.card_seq) or not needs_choice(index):
+				raise ValueError(f"action {action} not offered in room {game.current_room}")
+		events = step(action)
+		if game.endless_mode:
+			for event in events:
+				if event[0] == "room":
+					score = event[1]
+	return game, score
+
+def check(submission):
+	# (difficulty, verified score, reason it was rejected or None)
+	try:
+		run = replay.Replay.from_bytes(submission.log)
+	except replay.ReplayError as e:
+		return None, 0, f"unreadable log: {e}"
+	if run.max_hp != 20:
+		return run.difficulty, 0, "modified max HP"
+	if CHEATS.intersection(run.actions):
+		return run.difficulty, 0, "cheats used"
+	if engine.UNDO in run.actions:
+		return run.difficulty, 0, "undo used"
+	try:
+		game, score = endless_score(run)
+	except ValueError as e:
+		return run.difficulty, 0, f"illegal action: {e}"
+	if not game.over:
+		return run.difficulty, 0, "run not finished"
+	if (game.status, game.player.hp, game.current_room) != (run.status, run.hp, run.current_room):
+		return run.difficulty, 0, "log doesn't match its replay"
+	if score != submission.score:
+		return run.difficulty, score, f"wrong score: claimed {submission.score}, replay scores {score}"
+	return run.difficulty, score, None
+
+def check_batch(batch):
+	return [check(s) for s in batch]
+
+"""
+###############
+### SERVICE ###
+###############
+"""
+
+class LocalQueue:
+	# Stand-in for the real submission queue: anything with put() and a
+	# take(n) that returns up to n waiting submissions works
+	def __init__(self):
+		self.queue = queue.Queue()
+
+	def put(self, submission):
+		self.queue.put(submission)
+
+	def take(self, n, timeout=0.1):
+		batch = []
+		try:
+			batch.append(self.queue.get(timeout=timeout))
+			while len(batch) < n:
+				batch.append(self.queue.get_nowait())
+		except queue.Empty:
+			pass
+		return batch
+
+class Leaderboard:
+	def __init__(self):
+		self.best = {difficulty: {} for difficulty in engine.difficulties}
+
+	def add(self, result):
+		if result.verified and result.score > self.best[result.difficulty].get(result.player, 0):
+			self.best[result.difficulty][result.player] = result.score
+
+	def top(self, difficulty, n=10):
+		return sorted(self.best[difficulty].items(), key=lambda item: -item[1])[:n]
+
+class Verifier:
+	# Pulls batches off the queue and checks them on a worker pool. Results
+	# keep submission order within a batch.
+	def __init__(self, submissions, jobs=None, batch_size=5000, chunk_size=250, on_result=None):
+		self.submissions = submissions
+		self.jobs = jobs
+		self.batch_size = batch_size
+		self.chunk_size = chunk_size
+		self.on_result = on_result
+		self.pool = None
+
+	def __enter__(self):
+		if self.jobs != 1:
+			self.pool = Pool(self.jobs)
+		return self
+
+	def __exit__(self, *exc):
+		if self.pool:
+			self.pool.close()
+			self.pool.join()
+
+	def verify(self, batch):
+		chunks = [batch[i:i + self.chunk_size] for i in range(0, len(batch), self.chunk_size)]
+		checked = map(check_batch, chunks) if self.pool is None else self.pool.imap(check_batch, chunks)
+		results = []
+		for chunk, outcomes in zip(chunks, checked):
+			for submission, (difficulty, score, reason) in zip(chunk, outcomes):
+				result = Result(submission.player, difficulty, score, reason)
+				results.append(result)
+				if self.on_result:
+					self.on_result(result)
+		return results
+
+	def run_once(self, timeout=0.1):
+		# Verifies whatever is waiting, up to one batch
+		batch = self.submissions.take(self.batch_size, timeout)
+		return self.verify(batch) if batch else []
+
+"""
+############
+### DEMO ###
+############
+"""
+
+def endless_run(seed, difficulty, line, policy_seed, forge):
+	# Wins the seed with a solver line, then plays endless greedily until it
+	# dies, as a stand-in for a good player's run. forge tampers with it.
+	game = engine.Game(seed, difficulty)
+	if forge == "cheat":
+		game.can_die = False
+	for action in line:
+		game.step(action)
+	game.step(engine.ENDLESS)
+	policy = bots.GreedyPolicy(policy_seed)
+	if forge == "undo":
+		# Looks at the next room and takes it back
+		before = game.snapshot()
+		game.step(policy.choose(game))
+		game.restore(before)
+	score = 0
+	while not game.over and game.current_room < 200:
+		action = policy.choose(game)
+		if forge == "alias" and action % 2 and action + 1 not in game.legal_actions():
+			# Declining a card that offers no choice: the same move, not offered
+			action += 1
+			forge = None
+		for event in game.step(action):
+			if event[0] == "room" and game.endless_mode:
+				score = event[1]
+	if forge == "score":
+		score += 5
+	log = replay.Replay.from_game(game).to_bytes()
+	if forge == "illegal":
+		log = bytearray(log)
+		log[replay.HEADER.size + 4] ^= 0x77  # scramble a couple of actions
+		log = bytes(log)
+	if forge == "truncated":
+		log = log[:random.Random(policy_seed).randrange(len(log))]
+	return log, score
+
+def demo(n, jobs, seeds=20):
+	sys.setrecursionlimit(10000)
+	lines = []
+	for seed in range(seeds):
+		difficulty = engine.difficulties[seed % 2]
+		found = solver.SeedSolver(seed, difficulty)
+		if found.solve():
+			lines.append((seed, difficulty, found.best_line()))
+
+	rng = random.Random(0)
+	submissions = LocalQueue()
+	forges = []
+	for i in range(n):
+		forge = rng.choice([None] * 7 + ["cheat", "score", "illegal", "truncated", "undo", "alias"])
+		forges.append(forge)
+		log, score = endless_run(*rng.choice(lines), i, forge)
+		submissions.put(Submission(f"player{i % 100}", score, log))
+	print(f"{n} submissions queued, {n - forges.count(None)} forged")
+
+	board = Leaderboard()
+	reasons = {}
+	accepted = {}  # forgeries that got through, by forge
+	forge_of = iter(forges)  # results come back in submission order
+	def record(result):
+		forge = next(forge_of)
+		board.add(result)
+		if result.verified and forge:
+			accepted[forge] = accepted.get(forge, 0) + 1
+		if not result.verified:
+			reason = result.reason.split(":")[0]
+			reasons[reason] = reasons.get(reason, 0) + 1
+
+	start = time.perf_counter()
+	done = 0
+	with Verifier(submissions, jobs, on_result=record) as verifier:
+		while done < n:
+			done += len(verifier.run_once())
+	elapsed = time.perf_counter() - start
+	print(f"{done} verified in {elapsed:.2f}s ({done / elapsed:.0f}/s on {jobs} jobs)")
+	print(f"Rejected: {sum(reasons.values())} {reasons}")
+	print(f"Forgeries accepted: {accepted}")
+	# A scrambled byte can land on another legal run, but an unoffered move never passes
+	assert "alias" not in accepted, "unoffered action accepted"
+	for difficulty in engine.difficulties:
+		print(difficulty, board.top(difficulty, 3))
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Verify submitted runs by replaying them.")
+	parser.add_argument("--demo", type=int, default=10000, metavar="N", help="queue N generated submissions (some forged) and verify them")
+	parser.add_argument("--jobs", type=int, default=os.cpu_count())
+	args = parser.parse_args(argv)
+	demo(args.demo, args.jobs)
+
+if __name__ == "__main__":
+	main()